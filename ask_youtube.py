@@ -3,10 +3,9 @@ import csv
 import yt_dlp
 import sys
 
-levels: list
-with open('config/levels.csv') as levels_csv:
-    reader = csv.DictReader(levels_csv, skipinitialspace=True)
-    levels = [row['name'] for row in reader]
+from level_registry import get_level_registry
+
+levels = [level.name for level in get_level_registry().id2level.values()]
 
 writer = csv.writer(sys.stdout, delimiter='|')
 opts = { "quiet": True, "simulate": True }
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+# modules the CLI entry points import, and the dependencies they must not pull in on their own
+MODULES = ['level_registry', 'read_backends', 'write_backends', 'parser', 'mover_solnet', 'save2export']
+HEAVY_MODULES = ['psycopg2', 'schem', 'numpy']
+
+def measure(module: str) -> tuple[int, list[str]]:
+    """Returns the cumulative import time of `module` in us and the heavy modules it loaded"""
+    check = f'import sys, {module}; print(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])'
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', check],
+                          capture_output=True, text=True, check=True)
+
+    # import time: self [us] | cumulative | imported package
+    cumulative = 0
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and line.rsplit('|', 1)[-1].strip() == module:
+            cumulative = int(line.split('|')[1])
+    return cumulative, proc.stdout.split()
+
+def main():
+    failed = False
+    print('module, import ms, heavy modules')
+    for module in args.modules:
+        times = []
+        for _ in range(args.repeat):
+            cumulative, heavy = measure(module)
+            times.append(cumulative)
+        import_ms = statistics.median(times) / 1000
+
+        over_budget = import_ms > args.budget_ms
+        failed |= over_budget or bool(heavy)
+        print(f'{module}, {import_ms:.1f}{" OVER BUDGET" if over_budget else ""}, {" ".join(heavy)}')
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fails if importing an entry point is slower than the budget '
+                                                 'or loads an optional dependency eagerly')
+    parser.add_argument("modules", nargs='*', default=MODULES)
+    parser.add_argument("-b", "--budget-ms", type=float, default=100)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    main()
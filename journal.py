@@ -0,0 +1,73 @@
+import os
+from pathlib import Path
+
+"""
+Append-only record of what a mover run committed, every line is flushed to disk before going on:
+    begin|<sol_id>|<undo token>     about to write the solution
+    done|<sol_id>|<outcome>         it's fully written
+A begin without its done is a commit interrupted halfway, the write backend rolls it back with the token
+before the run resumes. The tokens of the finished commits are kept, they say where each solution got written.
+"""
+
+class Journal:
+
+    def __init__(self, path, resume=False) -> None:
+        self.path = Path(path)
+        self.resume = resume
+        self.done: dict[str, str] = {}          # sol_id -> outcome, in commit order
+        self.tokens: dict[str, str] = {}        # sol_id -> undo token, of the done commits which wrote something
+        self.interrupted: dict[str, str] = {}   # sol_id -> undo token
+        self.f = None
+
+        if resume and self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    if not line.endswith('\n'): # torn last line, its commit never finished
+                        break
+                    record, sol_id, value = line.rstrip('\n').split('|', 2)
+                    if record == 'begin':
+                        self.interrupted[sol_id] = value
+                    elif record == 'done':
+                        if sol_id in self.interrupted:
+                            self.tokens[sol_id] = self.interrupted.pop(sol_id)
+                        self.done[sol_id] = value
+
+    def recover(self, undo):
+        """Rolls back the interrupted commits with `undo(token)`, then starts appending to a compacted journal"""
+        for token in self.interrupted.values():
+            if token:
+                undo(token)
+        self.interrupted = {}
+
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            for sol_id, outcome in self.done.items():
+                if sol_id in self.tokens:
+                    print(f'begin|{sol_id}|{self.tokens[sol_id]}', file=f)
+                print(f'done|{sol_id}|{outcome}', file=f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.f = open(self.path, 'a')
+
+    def __contains__(self, sol_id) -> bool:
+        return str(sol_id) in self.done
+
+    def _record(self, line: str):
+        print(line, file=self.f)
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def begin(self, sol_id, token=''):
+        self._record(f'begin|{sol_id}|{token}')
+        self.interrupted[str(sol_id)] = token
+
+    def commit(self, sol_id, outcome):
+        self._record(f'done|{sol_id}|{outcome}')
+        if str(sol_id) in self.interrupted:
+            self.tokens[str(sol_id)] = self.interrupted.pop(str(sol_id))
+        self.done[str(sol_id)] = outcome
+
+    def close(self):
+        if self.f:
+            self.f.close()
@@ -0,0 +1,84 @@
+import csv
+import functools
+import os
+import pickle
+import typing
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+LEVELS_CSV = Path('config/levels.csv')
+SEEDS_CSV = Path('config/seeds.csv')
+CACHE_FILE = Path('data/levels.pickle')
+
+Level = typing.NamedTuple('Level', [('name', str), ('type', str), ('is_deterministic', bool)])
+
+class LevelRegistry(typing.NamedTuple):
+    ids: List[str]                              # save ids, in config order
+    id2level: Dict[str, Level]
+    id2name: Dict[str, str]
+    name2id: Dict[str, str]                     # same-name levels: the last one wins
+    solnet2id: Dict[Tuple[str, str], str]       # ("main", "1-1") -> save id
+    id2solnet: Dict[str, Tuple[str, str]]
+    id2ordinal: Dict[str, int]
+    seeds: Dict[Tuple[str, int], Tuple[int, int]] # (component type, output) -> (x, y)
+
+def normalize_solnet_id(category: str, number: str) -> Tuple[str, str]:
+    """SolutionNet dumps number researchnet levels as `<issue>-<assignment>`, config uses `<volume>-<issue>-<assignment>`"""
+    if category == 'researchnet' and number.count('-') == 1:
+        longissue, assign = map(int, number.split('-'))
+        volume, issue = (longissue-1)//12+1, (longissue-1)%12+1
+        return 'researchnet', f'{volume}-{issue}-{assign}'
+    return category, number
+
+def _sources_stamp() -> tuple:
+    return tuple(os.stat(path).st_mtime_ns for path in (LEVELS_CSV, SEEDS_CSV))
+
+def build_registry() -> LevelRegistry:
+    registry = LevelRegistry([], {}, {}, {}, {}, {}, {}, {})
+
+    with open(LEVELS_CSV) as levels_csv:
+        reader = csv.DictReader(levels_csv, skipinitialspace=True)
+        for row in reader:
+            save_id = row['saveId']
+            solnet_id = (row['category'], row['number']) # ("main", "1-1")
+            registry.id2ordinal[save_id] = len(registry.ids)
+            registry.ids.append(save_id)
+            registry.id2level[save_id] = Level(row['name'], row['type'], bool(int(row['isDeterministic'])))
+            registry.id2name[save_id] = row['name']
+            registry.name2id[row['name']] = save_id
+            registry.solnet2id[solnet_id] = save_id
+            registry.id2solnet[save_id] = solnet_id
+
+    with open(SEEDS_CSV) as seeds_csv:
+        reader = csv.DictReader(seeds_csv, skipinitialspace=True)
+        for row in reader:
+            registry.seeds[row['type'], int(row['output'])] = (int(row['x']), int(row['y']))
+
+    return registry
+
+@functools.cache
+def get_level_registry(cache_file: Path|None = CACHE_FILE) -> LevelRegistry:
+    """Loads the level metadata once per process, through `cache_file` if given.
+    The cache is rebuilt whenever one of the config csvs is newer than it."""
+    stamp = _sources_stamp()
+    if cache_file:
+        try:
+            with open(cache_file, 'rb') as f:
+                cached_stamp, registry = pickle.load(f)
+            if cached_stamp == stamp:
+                return registry
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError):
+            pass
+
+    registry = build_registry()
+
+    if cache_file:
+        tmp_file = Path(f'{cache_file}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_file, 'wb') as f:
+                pickle.dump((stamp, registry), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            tmp_file.unlink(missing_ok=True)
+
+    return registry
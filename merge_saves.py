@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import argparse
+import pathlib
+import shutil
+import sqlite3
+
+"""
+Merges the solutions of many saves into one, entirely in sqlite: every source is ATTACHed and its rows copied
+with INSERT ... SELECT, through two temp mapping tables:
+    level_map:  source level id -> target level id, base solutions stay base if the target has none for that
+                level, everything else is appended as `<level>!N` after the target's last CE solution
+    comp_map:   source component rowid -> target component rowid, allocated after the target's last one
+Undo history isn't copied.
+"""
+
+# tables hanging off Component.rowid
+COMPONENT_TABLES = ['Member', 'Pipe', 'Annotation']
+
+def table_columns(cur, schema: str, table: str) -> list[tuple[str, bool]]:
+    """(name, is integer primary key) of every column"""
+    return [(name, bool(pk) and col_type.upper() == 'INTEGER')
+            for _, name, col_type, _, _, pk in cur.execute(f'PRAGMA {schema}.table_info({table})').fetchall()]
+
+def copy_rows(cur, table: str, source_from: str, overrides: dict, order_by: str):
+    """INSERT ... SELECT of the columns both saves have, `overrides` replaces the selected expression"""
+    source_names = {name for name, _ in table_columns(cur, 'src', table)}
+    columns = [(name, pk) for name, pk in table_columns(cur, 'main', table) if name in source_names]
+    if 'rowid' in overrides and not any(pk for _, pk in columns):
+        columns.insert(0, ('rowid', True))
+    # integer primary keys are left for sqlite to allocate, unless they're remapped
+    selected = [overrides.get(name, 'NULL' if pk else f's.{name}') for name, pk in columns]
+    cur.execute(f"""INSERT INTO main.{table} ({', '.join(name for name, _ in columns)})
+                    SELECT {', '.join(selected)}
+                    {source_from}
+                    ORDER BY {order_by}""")
+    return cur.rowcount
+
+def merge_save(conn: sqlite3.Connection, source) -> int:
+    """Copies every solution of `source` in the save open on `conn`, returns how many"""
+    cur = conn.cursor()
+    cur.execute('ATTACH DATABASE ? AS src', (str(source),))
+    try:
+        with conn:
+            cur.execute('DROP TABLE IF EXISTS temp.level_map')
+            cur.execute(r"""CREATE TEMP TABLE level_map AS
+                            WITH source AS (
+                                SELECT id,
+                                       IIF(INSTR(id, '!'), SUBSTR(id, 1, INSTR(id, '!') - 1), id) AS base,
+                                       IIF(INSTR(id, '!'), CAST(SUBSTR(id, INSTR(id, '!') + 1) AS int), 0) AS n
+                                FROM src.Level),
+                            placed AS (
+                                SELECT id, base, n, (n = 0 AND base NOT IN (SELECT id FROM main.Level)) AS is_base
+                                FROM source
+                                -- a base the target already has is only worth moving if it has a layout
+                                WHERE n > 0 OR base NOT IN (SELECT id FROM main.Level)
+                                      OR EXISTS (SELECT 1 FROM src.Component c WHERE c.level_id = source.id)),
+                            last_ce AS (
+                                SELECT SUBSTR(id, 1, INSTR(id, '!') - 1) AS base,
+                                       MAX(CAST(SUBSTR(id, INSTR(id, '!') + 1) AS int)) AS n
+                                FROM main.Level WHERE INSTR(id, '!')
+                                GROUP BY base)
+                            SELECT placed.id AS src_id, placed.n AS src_n, is_base,
+                                   IIF(is_base, placed.base,
+                                       placed.base || '!' || (COALESCE(last_ce.n, 0) +
+                                           ROW_NUMBER() OVER (PARTITION BY placed.base, is_base ORDER BY placed.n))
+                                   ) AS dst_id
+                            FROM placed LEFT JOIN last_ce USING (base)""")
+            cur.execute('CREATE UNIQUE INDEX temp.level_map_src ON level_map (src_id)')
+
+            # base solutions turned into CE ones look like the ones SaveWriteBackend writes
+            solutions = copy_rows(cur, 'Level', 'FROM src.Level s JOIN level_map m ON m.src_id = s.id', {
+                'id': 'm.dst_id',
+                'passed': 'IIF(m.is_base OR m.src_n > 0, s.passed, 0)',
+                'mastered': "IIF(m.is_base OR m.src_n > 0, s.mastered, 'Unnamed Solution')",
+                'best_cycles': 'IIF(m.is_base OR m.src_n > 0, s.best_cycles, 0)',
+                'best_symbols': 'IIF(m.is_base OR m.src_n > 0, s.best_symbols, 0)',
+                'best_reactors': 'IIF(m.is_base OR m.src_n > 0, s.best_reactors, 0)',
+            }, 's.rowid')
+
+            cur.execute('DROP TABLE IF EXISTS temp.comp_map')
+            cur.execute(r"""CREATE TEMP TABLE comp_map AS
+                            SELECT c.rowid AS src_rowid, m.dst_id AS level_id,
+                                   (SELECT COALESCE(MAX(rowid), 0) FROM main.Component)
+                                       + ROW_NUMBER() OVER (ORDER BY c.rowid) AS dst_rowid
+                            FROM src.Component c JOIN level_map m ON m.src_id = c.level_id""")
+            cur.execute('CREATE UNIQUE INDEX temp.comp_map_src ON comp_map (src_rowid)')
+
+            component_pk = [name for name, pk in table_columns(cur, 'main', 'Component') if pk] or ['rowid']
+            copy_rows(cur, 'Component', 'FROM src.Component s JOIN comp_map m ON m.src_rowid = s.rowid', {
+                component_pk[0]: 'm.dst_rowid',
+                'level_id': 'm.level_id',
+            }, 's.rowid')
+
+            for table in COMPONENT_TABLES:
+                copy_rows(cur, table, f'FROM src.{table} s JOIN comp_map m ON m.src_rowid = s.component_id',
+                          {'component_id': 'm.dst_rowid'}, 's.rowid')
+    finally:
+        cur.execute('DETACH DATABASE src')
+    return solutions
+
+def main():
+    sources = list(args.saves)
+    if args.saves_dir:
+        sources += sorted(args.saves_dir.glob('**/*.user'))
+
+    if not args.output.exists():
+        if not args.template:
+            raise SystemExit(f'{args.output} does not exist, give a --template save to start it from')
+        shutil.copy(args.template, args.output)
+
+    conn = sqlite3.connect(args.output)
+    for source in sources:
+        print(f'Merged {merge_save(conn, source)} solutions from {source}')
+    conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merge the solutions of many saves into one')
+    parser.add_argument("output", type=pathlib.Path, help="save to merge into")
+    parser.add_argument("saves", type=pathlib.Path, nargs='*', default=[])
+    parser.add_argument("-d", "--saves-dir", type=pathlib.Path, nargs="?", const="saves",
+                        help="merge every .user save under <dir> too")
+    parser.add_argument("-t", "--template", type=pathlib.Path, nargs="?", const="data/new.user",
+                        help="empty save to copy if the output doesn't exist yet")
+    args = parser.parse_args()
+
+    main()
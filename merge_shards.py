@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+import argparse
+import collections
+import json
+import os
+import shutil
+import zlib
+from pathlib import Path
+
+from journal import Journal
+
+"""
+`mover_solnet.py --shard i/N` runs journaled and leaves a manifest next to its output
+(<export folder>/shard.json or <save>.shard.json), with the position every solution of the shard has
+in the full run. The journals say where each solution got written, so replaying all the shards in that order
+gives back what a single run would have written.
+"""
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """`i/N` -> (i, N), 0 <= i < N"""
+    index, count = map(int, spec.split('/'))
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f'shard {spec} is not in 0/{count}..{count - 1}/{count}')
+    return index, count
+
+def group_roots(solutions: list, links: list) -> dict:
+    """
+    sol_id -> sol_id of the first solution in its group, the solutions `link(solution)` maps to the same
+    not None value are in the same group, for every link
+    """
+    parent = list(range(len(solutions)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for link in links:
+        firsts = {}
+        for i, solution in enumerate(solutions):
+            value = link(solution)
+            if value is not None:
+                # the first solution stays the root
+                root, other = sorted((find(firsts.setdefault(value, i)), find(i)))
+                parent[other] = root
+    return {solution[0]: solutions[find(i)][0] for i, solution in enumerate(solutions)}
+
+def shard_of(key, count: int) -> int:
+    return key % count if isinstance(key, int) else zlib.crc32(str(key).encode()) % count
+
+def manifest_path(output) -> Path:
+    output = Path(output)
+    return output / 'shard.json' if output.is_dir() else output.with_name(output.name + '.shard.json')
+
+def write_manifest(output, index: int, count: int, by: str, replace_sols: bool, seqs: list):
+    """`seqs` is [(seq, sol_id)] of the solutions in the shard"""
+    with open(manifest_path(output), 'w') as f:
+        json.dump({'shard': index, 'shards': count, 'by': by, 'replace_sols': replace_sols,
+                   'solutions': seqs}, f)
+
+def read_shards(outputs: list) -> list[tuple[dict, Journal]]:
+    shards = []
+    for output in outputs:
+        with open(manifest_path(output)) as f:
+            manifest = json.load(f)
+        journal_path = Path(output) / 'journal.psv' if Path(output).is_dir() else f'{output}.journal'
+        shards.append((manifest, Journal(journal_path, resume=True)))
+
+    counts = {manifest['shards'] for manifest, _ in shards}
+    indexes = sorted(manifest['shard'] for manifest, _ in shards)
+    if len(counts) != 1 or indexes != list(range(counts.pop())):
+        raise SystemExit(f'Need exactly one output for every shard, got shards {indexes}')
+    for manifest, journal in shards:
+        if journal.interrupted or len(journal.done) != len(manifest['solutions']):
+            raise SystemExit(f"Shard {manifest['shard']} didn't finish, resume it first")
+    return shards
+
+def replay_order(shards: list) -> list[tuple[int, str, str, Path]]:
+    """(seq, sol_id, token, shard output) of every solution which wrote something, in single run order"""
+    order = []
+    for (manifest, journal), output in shards:
+        seqs = {str(sol_id): seq for seq, sol_id in manifest['solutions']}
+        order += [(seqs[sol_id], sol_id, token, output) for sol_id, token in journal.tokens.items()]
+    return sorted(order)
+
+def merge_exports(shard_folders: list, folder: Path):
+    shards = read_shards(shard_folders)
+    order = replay_order(list(zip(shards, map(Path, shard_folders))))
+
+    # (shard file, start of an append in it), the appends to a file come one after the other
+    appends = [(shard / Path(token.rsplit(':', 1)[0]).name, int(token.rsplit(':', 1)[1]))
+               for _, _, token, shard in order]
+    starts = collections.defaultdict(list)
+    for file, start in appends:
+        starts[file].append(start)
+    ends = {}
+    for file, file_starts in starts.items():
+        file_starts.sort()
+        ends.update({(file, start): end for start, end in zip(file_starts, file_starts[1:] + [os.path.getsize(file)])})
+
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    moved = {} # (shard file, start) -> where it starts in the merged file
+    for file, start in appends:
+        merged = folder / file.name
+        moved[file, start] = merged.stat().st_size if merged.exists() else 0
+        with open(file, 'rb') as src, open(merged, 'ab') as dst:
+            src.seek(start)
+            segment = src.read(ends[file, start] - start)
+            if file.name == 'duplicates.psv':
+                # the originals are in the same shard and were merged before their duplicates
+                segment = relocate_duplicates(segment, file.parent, moved)
+            dst.write(segment)
+
+def relocate_duplicates(segment: bytes, shard: Path, moved: dict) -> bytes:
+    """Points the `<file>.txt:<offset>` references of duplicates.psv lines at the merged files"""
+    lines = []
+    for line in segment.decode().splitlines(keepends=True):
+        file_name, reference, header = line.split('|', 2)
+        original_file, offset = reference.rsplit(':', 1)
+        lines.append(f'{file_name}|{original_file}:{moved[shard / original_file, int(offset)]}|{header}')
+    return ''.join(lines).encode()
+
+def merge_saves(shard_saves: list, savefile: Path):
+    from read_backends import SaveReadBackend
+    from write_backends import SaveWriteBackend
+
+    shards = read_shards(shard_saves)
+    replace_sols = shards[0][0]['replace_sols']
+    order = replay_order(list(zip(shards, map(Path, shard_saves))))
+
+    # a level id written again later in the same shard only holds the last solution, which replaces this one anyway
+    last_writes = {(shard, db_level_id): seq for seq, _, db_level_id, shard in order}
+
+    read_backends = {Path(save): SaveReadBackend(save) for save in shard_saves}
+    write_backend = SaveWriteBackend(savefile)
+    for seq, sol_id, db_level_id, shard in order:
+        if last_writes[shard, db_level_id] != seq:
+            continue
+        read_backend = read_backends[shard]
+        level = read_backend.cur.execute(r"""SELECT cycles, symbols, reactors, mastered
+                                             FROM Level WHERE id = ?""", (db_level_id,)).fetchone()
+
+        print(f'Replaying solution {sol_id}')
+        write_backend.write_solution(db_level_id.split('!')[0], None, level['cycles'], level['symbols'],
+                                     level['reactors'], level['mastered'] if '!' in db_level_id else None,
+                                     replace_sols)
+        for component in read_backend.read_components(db_level_id):
+            comp_id = component['rowid']
+            write_backend.write_component(component)
+            write_backend.write_members(read_backend.read_members(comp_id))
+            write_backend.write_pipes(read_backend.read_pipes(comp_id))
+            write_backend.write_annotations(read_backend.read_annotations(comp_id))
+        write_backend.commit(sol_id)
+
+    write_backend.close()
+    for read_backend in read_backends.values():
+        read_backend.close()
+
+def main():
+    if all(Path(shard).is_dir() for shard in args.shards):
+        merge_exports(args.shards, args.output)
+    else:
+        merge_saves(args.shards, args.output)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Combine the outputs of `mover_solnet.py --shard` runs')
+    parser.add_argument("output", type=Path, help="export folder, or save already holding what the shards started from")
+    parser.add_argument("shards", nargs='+', help="shard export folders or saves")
+    args = parser.parse_args()
+
+    main()
@@ -2,7 +2,9 @@
 
 import argparse
 
-from read_backends import ExportReadBackend, SolnetReadBackend
+from merge_shards import group_roots, parse_shard, shard_of, write_manifest
+from read_backends import ExportReadBackend, MirrorReadBackend, PooledSolnetReadBackend, SolnetReadBackend
+from validation import ValidationScheduler
 from write_backends import ExportWriteBackend, NoopWriteBackend, SaveWriteBackend, make_level_dicts
 
 
@@ -14,22 +16,87 @@ def main():
 
     if args.read_from_folder:
         read_backend = ExportReadBackend(args.read_from_folder, name2id)
+    elif args.read_from_mirror:
+        read_backend = MirrorReadBackend(args.read_from_mirror)
+    elif args.connections > 1:
+        read_backend = PooledSolnetReadBackend(args.connections)
     else:
         read_backend = SolnetReadBackend()
 
     if args.file_save:
-        write_backend = SaveWriteBackend(args.file_save)
+        write_backend = SaveWriteBackend(args.file_save, args.journal or args.shard, args.resume)
     elif args.export_folder:
-        write_backend = ExportWriteBackend(args.export_folder, id2name)
+        scheduler = None
+        if args.schem:
+            memory_budget = args.memory_budget << 20 if args.memory_budget else None
+            scheduler = ValidationScheduler(args.jobs, args.time_budget, memory_budget)
+        write_backend = ExportWriteBackend(args.export_folder, id2name, scheduler,
+                                           args.journal or args.shard, args.resume)
     else:
         write_backend = NoopWriteBackend()
 
     solutions = read_backend.read_solutions(args.sol_ids or args.levels, args.pareto_only)
+    layout_hashes = read_backend.read_layout_hashes(args.sol_ids or args.levels) if args.dedup else {}
+    layouts = {} # layout hash -> (sol_id, commit result) of the first solution with that layout
+
+    solutions = list(solutions)
+    if args.incremental:
+        # every solution in the save accounts for one identical solution to skip
+        existing = write_backend.existing_solutions()
+        missing = []
+        for solution in solutions:
+            sol_id, db_level_name, _, comment, c, s, r = solution
+            key = (db_level_name, c, s, r, write_backend.stored_description(comment))
+            if existing[key]:
+                existing[key] -= 1
+            else:
+                missing.append(solution)
+        print(f'Skipping {len(solutions) - len(missing)} solutions already in the save')
+        solutions = missing
+
+    if args.shard:
+        # dedup references never cross shards, and when saving over the base solutions every write to a level
+        # stays in the same shard too, as it decides if the references to that level are still good
+        index, count = args.shard
+        links = [lambda solution: layout_hashes.get(solution[0])]
+        if args.file_save and args.replace_sols:
+            links.append(lambda solution: solution[1])
+        keys = group_roots(solutions, links)
+        levels = {sol_id: db_level_name for sol_id, db_level_name, *_ in solutions}
+        if args.shard_by == 'level':
+            keys = {sol_id: levels[key] for sol_id, key in keys.items()}
+        shard = [(seq, solution) for seq, solution in enumerate(solutions) if shard_of(keys[solution[0]], count) == index]
+        write_manifest(args.file_save or args.export_folder, index, count, args.shard_by, args.replace_sols,
+                       [(seq, solution[0]) for seq, solution in shard])
+        solutions = [solution for _, solution in shard]
+
+    if write_backend.journal:
+        print(f'Skipping {len(write_backend.journal.done)} solutions already committed')
+        solutions = [solution for solution in solutions if solution[0] not in write_backend.journal]
+        # what the interrupted run wrote can still be referenced
+        hashed_ids = {str(sol_id): sol_id for sol_id in layout_hashes}
+        for sol_id, committed in write_backend.resumed_commits().items():
+            if sol_id in hashed_ids:
+                layouts[layout_hashes[hashed_ids[sol_id]]] = (hashed_ids[sol_id], committed)
+
+    # duplicates won't be read, unless their reference is refused
+    first_layouts = {}
+    for sol_id, *_ in solutions:
+        first_layouts.setdefault(layout_hashes.get(sol_id, sol_id), sol_id)
+    read_backend.prefetch([sol_id for sol_id, *_ in solutions
+                           if first_layouts[layout_hashes.get(sol_id, sol_id)] == sol_id
+                           and layout_hashes.get(sol_id) not in layouts])
+
     for solution in solutions:
         sol_id, db_level_name, player_name, comment, c, s, r = solution
         print(f'Loading solution {sol_id}')
         write_backend.write_solution(db_level_name, player_name, c, s, r, comment, args.replace_sols)
 
+        layout = layout_hashes.get(sol_id)
+        if layout in layouts and write_backend.write_reference(*layouts[layout]):
+            write_backend.commit(db_level_name if args.group_exports_by_level else sol_id, sol_id=sol_id)
+            continue
+
         reactors = read_backend.read_components(sol_id)
         for reactor in reactors:
             comp_id = reactor['component_id']
@@ -41,9 +108,16 @@ def main():
             pipes = read_backend.read_pipes(comp_id, reactor['type'])
             write_backend.write_pipes(pipes)
 
-        write_backend.commit(db_level_name if args.group_exports_by_level else sol_id, args.schem, args.check_precog)
+            annotations = read_backend.read_annotations(comp_id)
+            write_backend.write_annotations(annotations)
+
+        committed = write_backend.commit(db_level_name if args.group_exports_by_level else sol_id,
+                                         args.schem, args.check_precog, sol_id)
+        if layout:
+            layouts[layout] = (sol_id, committed)
 
     write_backend.close()
+    read_backend.close()
 
 
 if __name__ == '__main__':
@@ -57,8 +131,32 @@ if __name__ == '__main__':
     parser.add_argument("--group-exports-by-level", default=False, action=argparse.BooleanOptionalAction)
     parser.add_argument("--pareto-only", default=False, action=argparse.BooleanOptionalAction)
     parser.add_argument("--read-from-folder", nargs="?", const=r'exports')
+    parser.add_argument("--read-from-mirror", nargs="?", const=r'data/mirror',
+                        help="read from the columnar copy made by solnet_mirror.py instead of the db")
+    parser.add_argument("-c", "--connections", type=int, default=1,
+                        help="read SolutionNet on this many connections in parallel")
     parser.add_argument("-s", "--schem", default=False, action=argparse.BooleanOptionalAction)
     parser.add_argument("--check-precog", default=False, action=argparse.BooleanOptionalAction)
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="schem worker processes, most expensive first")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="seconds a single schem validation may take before it's killed")
+    parser.add_argument("--memory-budget", type=int, default=None,
+                        help="MB a single schem validation may use before it's killed")
+    parser.add_argument("--journal", default=False, action=argparse.BooleanOptionalAction,
+                        help="record every committed solution, so an interrupted run can be resumed")
+    parser.add_argument("--resume", default=False, action=argparse.BooleanOptionalAction,
+                        help="continue a journaled run in the same export folder or save, skipping what it committed")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="only do the i-th of N parts of the solutions, merge the outputs with merge_shards.py")
+    parser.add_argument("--shard-by", choices=['id', 'level'], default='id')
+    parser.add_argument("--incremental", default=False, action=argparse.BooleanOptionalAction,
+                        help="only add the solutions the save doesn't have yet, needs --no-replace-sols")
+    parser.add_argument("--dedup", default=False, action=argparse.BooleanOptionalAction,
+                        help="write each distinct layout once, identical solutions become references to the first one")
     args = parser.parse_args()
+    if args.shard and not (args.file_save or args.export_folder):
+        parser.error("--shard needs a save or an export folder to write to")
+    if args.incremental and not (args.file_save and not args.replace_sols):
+        parser.error("--incremental adds CE solutions to a save, it needs -f and --no-replace-sols")
 
     main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+from typing import Sequence
+
+import numpy as np
+
+from level_registry import get_level_registry, normalize_solnet_id
+
+OFFICIAL_SCORES_CSV = 'data/official_scores_dump.csv'
+
+# column order of every (n, 3) array in here, same as the c/r/s score notation
+METRICS = ['Cycle Counts', 'Reactor Counts', 'Symbol Counts']
+
+"""
+Every histogram is a space-separated string:
+    <min> <max> <bucket width> <y min> <y max> <y max/6> <bucket 0> <bucket 1> ... <bucket (max-min)/width - 1>
+bucket i counts the solutions scoring in [min + i*width, min + (i+1)*width), the last one includes everything above
+"""
+
+class OfficialScores:
+
+    def __init__(self, level_ids: list, low: np.ndarray, width: np.ndarray,
+                 n_buckets: np.ndarray, counts: np.ndarray) -> None:
+        """low, width, n_buckets: (levels, 3); counts: (levels, 3, max buckets), zero-padded"""
+        self.level_ids = level_ids
+        self.id2row = {level_id: i for i, level_id in enumerate(level_ids)}
+        self.low = low
+        self.width = width
+        self.n_buckets = n_buckets
+        self.counts = counts
+        # cumulative[..., i] = solutions in the buckets before i
+        self.cumulative = np.concatenate([np.zeros(counts.shape[:2] + (1,), dtype=counts.dtype),
+                                          np.cumsum(counts, axis=2)], axis=2)
+        self.totals = self.cumulative[:, :, -1]
+
+    @classmethod
+    def load(cls, path=OFFICIAL_SCORES_CSV) -> 'OfficialScores':
+        solnet2id = get_level_registry().solnet2id
+
+        latest = {} # save id -> row, the last scrape wins
+        with open(path) as scorescsv:
+            reader = csv.DictReader(scorescsv)
+            for row in reader:
+                save_id = solnet2id[normalize_solnet_id(row['Level Category'], row['Level Number'])]
+                if save_id not in latest or row['Scrape Date'] >= latest[save_id]['Scrape Date']:
+                    latest[save_id] = row
+
+        level_ids = list(latest)
+        histograms = [[latest[level_id][metric].split() for metric in METRICS] for level_id in level_ids]
+        max_buckets = max(len(histogram) - 6 for level in histograms for histogram in level)
+
+        header = np.array([[histogram[:3] for histogram in level] for level in histograms], dtype=float)
+        counts = np.zeros((len(level_ids), len(METRICS), max_buckets), dtype=np.int64)
+        n_buckets = np.zeros((len(level_ids), len(METRICS)), dtype=np.int64)
+        for i, level in enumerate(histograms):
+            for j, histogram in enumerate(level):
+                n_buckets[i, j] = len(histogram) - 6
+                counts[i, j, :n_buckets[i, j]] = np.array(histogram[6:], dtype=np.int64)
+
+        return cls(level_ids, header[:, :, 0], header[:, :, 2], n_buckets, counts)
+
+    def lookup(self, level_ids: Sequence[str], cycles, reactors, symbols) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (percentiles, ranks), both (n, 3) in c/r/s order.
+        The percentile is the share of official uploads the score is at least as good as,
+        the rank is the estimated 1-based position among them. Levels without a histogram are NaN.
+        """
+        rows = np.array([self.id2row.get(level_id, -1) for level_id in level_ids], dtype=np.int64)
+        values = np.stack([np.asarray(cycles, dtype=float),
+                           np.asarray(reactors, dtype=float),
+                           np.asarray(symbols, dtype=float)], axis=1)
+        known = rows >= 0
+        safe_rows = np.where(known, rows, 0)[:, None]
+        metrics = np.arange(len(METRICS))[None, :]
+
+        low = self.low[safe_rows, metrics]
+        width = self.width[safe_rows, metrics]
+        position = (values - low) / width
+        bucket = np.clip(np.floor(position), 0, self.n_buckets[safe_rows, metrics] - 1).astype(np.int64)
+        # linear interpolation inside the bucket, everything past the last one is counted as its end
+        inside = np.clip(position - bucket, 0, 1)
+
+        better = self.cumulative[safe_rows, metrics, bucket] + inside * self.counts[safe_rows, metrics, bucket]
+        totals = self.totals[safe_rows, metrics]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            percentiles = 100 * (totals - better) / totals
+        ranks = better + 1
+
+        percentiles[~known] = np.nan
+        ranks[~known] = np.nan
+        return percentiles, ranks
+
+    def lookup_one(self, level_id: str, cycles, reactors, symbols) -> tuple[np.ndarray, np.ndarray]:
+        percentiles, ranks = self.lookup([level_id], [cycles], [reactors], [symbols])
+        return percentiles[0], ranks[0]
+
+def main():
+    scores = OfficialScores.load()
+    level_id = get_level_registry().name2id.get(args.level, args.level)
+    percentiles, ranks = scores.lookup_one(level_id, args.cycles, args.reactors, args.symbols)
+    for metric, percentile, rank in zip(METRICS, percentiles, ranks):
+        print(f'{metric}: better than or equal to {percentile:.1f}% of official uploads, rank ~{rank:.0f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("level", help="save id or level name")
+    parser.add_argument("cycles", type=int)
+    parser.add_argument("reactors", type=int)
+    parser.add_argument("symbols", type=int)
+    args = parser.parse_args()
+
+    main()
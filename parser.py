@@ -3,13 +3,16 @@
 import argparse
 import bisect
 import csv
+import operator
 import re
 import sqlite3
 import typing
 from collections import Counter, OrderedDict
+from datetime import datetime
 from pathlib import Path
 from typing import Dict, List
 
+from level_registry import Level, get_level_registry, normalize_solnet_id
 from read_backends import SaveReadBackend
 
 ### Configuration block
@@ -26,8 +29,6 @@ archive_path = Path(r'../archive/')
 {'id': 'fusion-1', 'passed': 1, 'mastered': 0, 'cycles': 52, 'symbols': 38, 'reactors': 1, 'best_cycles': 52, 'best_symbols': 11, 'best_reactors': 1}
 """
 
-Level = typing.NamedTuple('Level', [('name', str), ('type', str), ('is_deterministic', bool)])
-
 class Solution(typing.NamedTuple):
     cycles: int
     reactors: int
@@ -68,16 +69,24 @@ solnet2id: Dict[tuple, str] = {}
 id2level: Dict[str, Level] = {}
 level_solutions: Dict[str, List[Solution]] = OrderedDict()
 
+# record metric -> tiebreak order
+RECORD_METRICS = {'C': operator.attrgetter('cycles', 'reactors', 'symbols'),
+                  'S': operator.attrgetter('symbols', 'reactors', 'cycles'),
+                  'RC': operator.attrgetter('reactors', 'cycles', 'symbols'),
+                  'RS': operator.attrgetter('reactors', 'symbols', 'cycles')}
+# flag class suffix -> (bugged allowed, precognitive allowed)
+RECORD_FLAGS = {'': (True, True), 'NB': (False, True), 'NP': (True, False), 'NBP': (False, False)}
+# level id -> category (metric + flag class, e.g. 'CNB') -> record holder, kept up to date by add_solution
+record_index: Dict[str, Dict[str, Solution]] = {}
+
 def init():
 
-    with open('config/levels.csv') as levelscsv:
-        reader = csv.DictReader(levelscsv, skipinitialspace=True)
-        for row in reader:
-            save_id = row['saveId']
-            solnet_id = (row['category'], row['number']) # ("main", "1-1")
-            solnet2id[solnet_id] = save_id
-            id2level[save_id] = Level(row['name'], row['type'], bool(int(row['isDeterministic'])))
-            level_solutions[save_id] = []
+    registry = get_level_registry()
+    solnet2id.update(registry.solnet2id)
+    id2level.update(registry.id2level)
+    for save_id in registry.ids:
+        level_solutions[save_id] = []
+        record_index[save_id] = {}
 
 
 def dominance_compare(s1: Solution, s2: Solution):
@@ -99,23 +108,42 @@ def dominance_compare(s1: Solution, s2: Solution):
         # equal is already captured by the 1st check, this is for "not comparable"
         return 0
 
-def add_solution(save_id: str, candidate: Solution, test_reject=True, test_frontier=True):
+def add_solution(save_id: str, candidate: Solution, test_reject=True, test_frontier=True) -> bool:
+    """Returns whether the candidate made it to the frontier"""
 
     if test_reject and should_reject(candidate):
-        return
+        return False
 
     solutions = level_solutions[save_id]
+    removed = []
     if test_frontier:
         for i in range(len(solutions)-1, -1, -1): # iterate backwards so we can delete things
             solution = solutions[i]
             r = dominance_compare(candidate, solution)
             if r > 0:
-                return
+                return False
             elif r < 0:
                 # candidate.categories += solution.categories
+                removed.append(solution)
                 del solutions[i]
 
     bisect.insort(solutions, candidate, key=lambda s: s.score())
+    update_records(save_id, candidate, removed)
+    return True
+
+def update_records(save_id: str, candidate: Solution, removed: List[Solution]):
+    """
+    A solution dominating a record holder is at least as good in every metric and flag, so it takes the record over,
+    otherwise it only needs to beat the holder, ties stay with the preexisting one
+    """
+    records = record_index[save_id]
+    for flags, (bugged_allowed, precognitive_allowed) in RECORD_FLAGS.items():
+        if (candidate.is_bugged and not bugged_allowed) or (candidate.is_precognitive and not precognitive_allowed):
+            continue
+        for metric, tiebreaks in RECORD_METRICS.items():
+            holder = records.get(metric + flags)
+            if holder is None or any(holder is solution for solution in removed) or tiebreaks(candidate) < tiebreaks(holder):
+                records[metric + flags] = candidate
 
 
 def should_reject(solution: Solution) -> bool:
@@ -126,7 +154,8 @@ def should_reject(solution: Solution) -> bool:
            solution.symbols > 320*solution.reactors or \
            solution.cycles < 1.5*solution.reactors
 
-def parse_solnet():
+def read_solnet():
+    """(upload time, level id, solution) of every score_dump row that counts, in file order"""
 
     with open('config/users.csv') as userscsv:
         reader = csv.DictReader(userscsv, skipinitialspace=True)
@@ -135,14 +164,7 @@ def parse_solnet():
     with open('data/score_dump.csv') as scorescsv:
         reader = csv.DictReader(scorescsv)
         for row in reader:
-            if row['Level Category'] == 'researchnet' and \
-               row['Level Number'].count('-') == 1:
-                    longissue, assign = map(int, row['Level Number'].split('-'))
-                    volume, issue = (longissue-1)//12+1, (longissue-1)%12+1
-                    solnet_id = ('researchnet', f'{volume}-{issue}-{assign}')
-            else:
-                solnet_id = (row['Level Category'], row['Level Number'])
-
+            solnet_id = normalize_solnet_id(row['Level Category'], row['Level Number'])
             save_id = solnet2id[solnet_id]
             level = id2level[save_id]
             author = row['Username']
@@ -163,7 +185,35 @@ def parse_solnet():
                                          is_precognitive=not level.is_deterministic,
                                          author=author,
                                          display_link=row['Youtube Link'])
-                add_solution(save_id, this_solution)
+                upload_time = datetime.fromisoformat(row['Upload Time']) if row['Upload Time'] else datetime.min
+                yield upload_time, save_id, this_solution
+
+def parse_solnet():
+    for _, save_id, solution in read_solnet():
+        add_solution(save_id, solution)
+
+def sweep_solnet(at: List[datetime], printset, with_percentiles=False):
+    """
+    Replays the SolutionNet uploads in time order on empty frontiers, printing the frontiers as they were
+    at every `at` date, or every frontier change as `time|level|+added` and `time|level|-removed` lines without dates
+    """
+    snapshots = sorted(at)
+    def print_snapshot():
+        print(f'### {snapshots.pop(0)}')
+        print()
+        print_solutions(printset, with_percentiles)
+
+    for upload_time, save_id, solution in sorted(read_solnet(), key=operator.itemgetter(0)):
+        while snapshots and snapshots[0] <= upload_time:
+            print_snapshot()
+        frontier = level_solutions[save_id].copy()
+        if add_solution(save_id, solution) and not at and id2level[save_id].type in printset:
+            print(f'{upload_time}|{save_id}|+{solution.marshal()}')
+            for old in frontier:
+                if not any(old is kept for kept in level_solutions[save_id]):
+                    print(f'{upload_time}|{save_id}|-{old.marshal()}')
+    while snapshots:
+        print_snapshot()
 
 
 def parse_saves():
@@ -226,31 +276,59 @@ def parse_youtube():
                                          display_link=link)
                 add_solution(level_id, this_solution)
 
-def print_solutions(printset):
+def upload_date(value: str) -> datetime:
+    """A --at date, naive like the score_dump upload times"""
+    date = datetime.fromisoformat(value)
+    if date.tzinfo:
+        raise argparse.ArgumentTypeError(f"{value}: the upload times have no timezone, leave it out")
+    return date
+
+def frontier_percentiles(level_ids) -> dict:
+    """Official histogram percentiles (c, r, s) of every frontier solution of `level_ids`, in one batch"""
+    from official_scores import OfficialScores
+
+    keys = [(level_id, solution) for level_id in level_ids for solution in level_solutions[level_id]]
+    if not keys:
+        return {}
+    percentiles, _ = OfficialScores.load().lookup([level_id for level_id, _ in keys],
+                                                  [solution.cycles for _, solution in keys],
+                                                  [solution.reactors for _, solution in keys],
+                                                  [solution.symbols for _, solution in keys])
+    return dict(zip(keys, percentiles.tolist()))
+
+def print_solutions(printset, with_percentiles=False):
 
     if not printset:
         return
 
-    for level_id in level_solutions:
-        solutions = level_solutions[level_id]
-        if not solutions:
-            continue
+    printed_ids = [level_id for level_id, solutions in level_solutions.items()
+                   if solutions and id2level[level_id].type in printset]
+    percentiles = frontier_percentiles(printed_ids) if with_percentiles else {}
 
+    for level_id in printed_ids:
+        solutions = level_solutions[level_id]
         level = id2level[level_id]
-        if level.type not in printset:
-            continue
 
         print(f'{level.name} - {level_id}')
         for solution in solutions:
-            print(solution.marshal())
+            if with_percentiles:
+                print(solution.marshal() + '|{:.1f}/{:.1f}/{:.1f}'.format(*percentiles[level_id, solution]))
+            else:
+                print(solution.marshal())
         print()
 
-def print_leaderboard(include_frontier: bool):
+def print_leaderboard(include_frontier: bool, records=False):
     leaderboard = Counter()
-    for solutions in level_solutions.values():
-        for solution in solutions:
-            if include_frontier or solution.categories:
+    if records:
+        # a solution holding several records is counted once
+        for level_records in record_index.values():
+            for solution in {id(solution): solution for solution in level_records.values()}.values():
                 leaderboard[solution.author] += 1
+    else:
+        for solutions in level_solutions.values():
+            for solution in solutions:
+                if include_frontier or solution.categories:
+                    leaderboard[solution.author] += 1
 
     print('{} {} solutions by {} users'.format(sum(leaderboard.values()),
                                                'frontier' if include_frontier else 'record',
@@ -268,21 +346,37 @@ if __name__ == '__main__':
     parser.add_argument("-y", "--youtube", default=False, action=argparse.BooleanOptionalAction)
     parser.add_argument("-p", "--print", choices={'research', 'production', 'boss'}, nargs='+', default=['research', 'production', 'boss'])
     parser.add_argument("--no-print", choices={'research', 'production', 'boss'}, nargs='+', default=[])
+    parser.add_argument("--percentiles", default=False, action=argparse.BooleanOptionalAction,
+                        help="append the c/r/s percentiles against the official histograms to every solution")
     parser.add_argument("--leaderboard", default=False, action=argparse.BooleanOptionalAction)
     parser.add_argument("--include-frontier", default=False, action=argparse.BooleanOptionalAction)
+    parser.add_argument("--records", default=False, action=argparse.BooleanOptionalAction,
+                        help="count the solutions holding a record in the computed index, not the archive categories")
+    parser.add_argument("--history", default=False, action=argparse.BooleanOptionalAction,
+                        help="sweep the SolutionNet uploads alone in time order, printing every frontier change, "
+                             "needs --no-archive")
+    parser.add_argument("--at", type=upload_date, nargs='+', default=[], metavar="DATE",
+                        help="with --history, print the frontiers as they were at these dates instead")
     args = parser.parse_args()
+    if args.at and not args.history:
+        parser.error("--at needs --history")
+    if args.history and (args.archive or args.saves or args.youtube):
+        parser.error("--history replays SolutionNet alone, the other sources have no upload times: "
+                     "add --no-archive and drop --saves/--youtube")
 
     init()
     if args.archive:
         parse_archive()
-    if args.solnet:
+    if args.solnet and not args.history:
         parse_solnet()
     if args.saves:
         parse_saves()
     if args.youtube:
         parse_youtube()
 
-    if args.leaderboard:
-        print_leaderboard(args.include_frontier)
+    if args.history:
+        sweep_solnet(args.at, set(args.print) - set(args.no_print), args.percentiles)
+    elif args.leaderboard:
+        print_leaderboard(args.include_frontier, args.records)
     else:
-        print_solutions(set(args.print) - set(args.no_print))
+        print_solutions(set(args.print) - set(args.no_print), args.percentiles)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, unquote, urlparse
+
+import parser as frontier
+from level_registry import get_level_registry
+from parser import Solution
+
+"""
+GET  /levels                    level ids and frontier sizes
+GET  /levels/<level>            frontier of a level, by save id or name
+GET  /authors/<author>          frontier solutions and records held by an author, from parser.record_index
+GET  /check?level=&cycles=&reactors=&symbols=[&bugged=1][&precog=1]
+                                would this score make the frontier, and what would it replace
+POST /solutions                 {"level", "cycles", "reactors", "symbols", "author"
+                                 [, "bugged", "precog", "display_link", "categories", "test_reject"]}
+                                add a solution with the parser rules, the indexes are updated in place
+"""
+
+class FrontierIndex:
+    """Indexes over parser.level_solutions, kept in sync by add()"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.registry = get_level_registry()
+        # author -> level -> solutions
+        self.by_author: Dict[str, Dict[str, List[Solution]]] = defaultdict(dict)
+        for level_id in frontier.level_solutions:
+            self._index_level(level_id)
+
+    def _index_level(self, level_id):
+        for solution in frontier.level_solutions[level_id]:
+            self.by_author[solution.author].setdefault(level_id, []).append(solution)
+
+    def _unindex_level(self, level_id):
+        for author in {solution.author for solution in frontier.level_solutions[level_id]}:
+            self.by_author[author].pop(level_id, None)
+            if not self.by_author[author]:
+                del self.by_author[author]
+
+    def resolve_level(self, level: str) -> str:
+        level_id = self.registry.name2id.get(level, level)
+        if level_id not in frontier.level_solutions:
+            raise KeyError(level)
+        return level_id
+
+    def levels(self) -> list:
+        with self.lock:
+            return [{'level_id': level_id, 'level': frontier.id2level[level_id].name, 'solutions': len(solutions)}
+                    for level_id, solutions in frontier.level_solutions.items()]
+
+    def level(self, level: str) -> list:
+        level_id = self.resolve_level(level)
+        with self.lock:
+            return [solution_json(solution) for solution in frontier.level_solutions[level_id]]
+
+    def author(self, author: str) -> dict:
+        with self.lock:
+            levels = self.by_author.get(author, {})
+            solutions, records = [], []
+            for level_id in sorted(levels, key=self.registry.id2ordinal.get):
+                for solution in levels[level_id]:
+                    solutions.append({'level_id': level_id, **solution_json(solution)})
+                    held = [category for category, holder in frontier.record_index[level_id].items()
+                            if holder is solution]
+                    if held:
+                        records.append({'level_id': level_id, 'records': held, **solution_json(solution)})
+        return {'author': author,
+                'frontier': solutions,
+                'records': records}
+
+    def check(self, level: str, candidate: Solution) -> dict:
+        level_id = self.resolve_level(level)
+        with self.lock:
+            dominated_by, dominates = [], []
+            for solution in frontier.level_solutions[level_id]:
+                r = frontier.dominance_compare(candidate, solution)
+                if r > 0:
+                    dominated_by.append(solution_json(solution))
+                elif r < 0:
+                    dominates.append(solution_json(solution))
+        return {'level_id': level_id,
+                'rejected': frontier.should_reject(candidate),
+                'frontier': not dominated_by,
+                'dominated_by': dominated_by,
+                'would_remove': dominates}
+
+    def add(self, level: str, candidate: Solution, test_reject=True) -> dict:
+        level_id = self.resolve_level(level)
+        with self.lock:
+            before = set(frontier.level_solutions[level_id])
+            self._unindex_level(level_id)
+            added = frontier.add_solution(level_id, candidate, test_reject=test_reject)
+            self._index_level(level_id)
+            removed = before - set(frontier.level_solutions[level_id])
+        return {'level_id': level_id,
+                'added': added,
+                'removed': [solution_json(solution) for solution in removed]}
+
+def solution_json(solution: Solution) -> dict:
+    return {'score': solution.marshal().split('|', 1)[0], **solution._asdict()}
+
+def required(params: dict, name: str):
+    if name not in params:
+        raise ValueError(f'missing {name}')
+    return params[name]
+
+def solution_from_params(params: dict) -> Solution:
+    def flag(name):
+        return str(params.get(name, '0')).lower() in ('1', 'true', 'yes')
+
+    return Solution(cycles=int(required(params, 'cycles')),
+                    reactors=int(required(params, 'reactors')),
+                    symbols=int(required(params, 'symbols')),
+                    is_bugged=flag('bugged'),
+                    is_precognitive=flag('precog'),
+                    author=params.get('author', ''),
+                    display_link=params.get('display_link', ''),
+                    categories=params.get('categories', ''))
+
+class QueryHandler(BaseHTTPRequestHandler):
+    index: FrontierIndex
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_errors(self, action):
+        try:
+            self.send_json(action())
+        except KeyError as e:
+            self.send_json({'error': f'unknown {e}'}, 404)
+        except (ValueError, TypeError) as e:
+            self.send_json({'error': str(e)}, 400)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if parts == ['levels']:
+            self.handle_errors(self.index.levels)
+        elif len(parts) == 2 and parts[0] == 'levels':
+            self.handle_errors(lambda: self.index.level(parts[1]))
+        elif len(parts) == 2 and parts[0] == 'authors':
+            self.handle_errors(lambda: self.index.author(parts[1]))
+        elif parts == ['check']:
+            self.handle_errors(lambda: self.index.check(required(params, 'level'), solution_from_params(params)))
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/solutions':
+            self.send_json({'error': 'not found'}, 404)
+            return
+
+        def add():
+            params = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            test_reject = params.get('test_reject', True)
+            if not isinstance(test_reject, bool):
+                raise ValueError('test_reject must be true or false')
+            return self.index.add(required(params, 'level'), solution_from_params(params),
+                                  test_reject=test_reject)
+        self.handle_errors(add)
+
+    def log_message(self, format, *args):
+        if not server_args.quiet:
+            super().log_message(format, *args)
+
+def main():
+    frontier.init()
+    if server_args.archive:
+        frontier.parse_archive()
+    if server_args.solnet:
+        frontier.parse_solnet()
+    if server_args.saves:
+        frontier.parse_saves()
+    if server_args.youtube:
+        frontier.parse_youtube()
+
+    QueryHandler.index = FrontierIndex()
+    server = ThreadingHTTPServer((server_args.host, server_args.port), QueryHandler)
+    print(f'Serving {sum(map(len, frontier.level_solutions.values()))} frontier solutions '
+          f'on http://{server_args.host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("-a", "--archive", default=True, action=argparse.BooleanOptionalAction)
+    argparser.add_argument("-n", "--solnet", default=False, action=argparse.BooleanOptionalAction)
+    argparser.add_argument("-s", "--saves", default=False, action=argparse.BooleanOptionalAction)
+    argparser.add_argument("-y", "--youtube", default=False, action=argparse.BooleanOptionalAction)
+    argparser.add_argument("--host", default='127.0.0.1')
+    argparser.add_argument("--port", type=int, default=8421)
+    argparser.add_argument("-q", "--quiet", default=False, action=argparse.BooleanOptionalAction)
+    server_args = argparser.parse_args()
+
+    main()
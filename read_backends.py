@@ -1,15 +1,31 @@
 import collections
-import csv
+import hashlib
 import itertools
 import operator
+import re
 import sqlite3
 from abc import ABC, abstractmethod
 from pathlib import Path
 from typing import Iterable, List
 
-import psycopg2
-import psycopg2.extras
-import schem
+from level_registry import get_level_registry
+
+
+class Row(tuple):
+    """A tuple which can also be indexed by column name, like `sqlite3.Row` and `DictRow`"""
+    fields: tuple = ()
+
+    @classmethod
+    def make_type(cls, *fields):
+        return type(cls.__name__, (cls,), {'fields': fields})
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self.fields.index(key)
+        return super().__getitem__(key)
+
+    def keys(self):
+        return list(self.fields)
 
 
 class AbstractReadBackend(ABC):
@@ -58,16 +74,50 @@ class AbstractReadBackend(ABC):
     def read_annotations(self, comp_id):
         pass
 
+    def read_layout_hashes(self, ids: list) -> dict:
+        """sol_id -> hash of the solution layout (components, members, pipes), empty if the backend can't tell"""
+        return {}
+
+    def prefetch(self, sol_ids: list):
+        """Hint that the components of `sol_ids` will be read next, in this order"""
+        pass
+
     @abstractmethod
     def close(self):
         pass
 
 class SaveReadBackend(AbstractReadBackend):
 
-    def __init__(self, savefile) -> None:
+    def __init__(self, savefile, indexed=False) -> None:
         self.conn = sqlite3.connect(f'file:{savefile}?mode=ro', uri=True)
         self.conn.row_factory = sqlite3.Row
         self.cur = self.conn.cursor()
+        self.indexed = indexed
+        if indexed:
+            self._build_index()
+
+        self.members: dict = {}
+        self.pipes: dict = {}
+        self.annotations: dict = {}
+
+    def _build_index(self):
+        # everything lives in the temp schema, the save itself is never touched
+        self.cur.execute(r"""CREATE TEMP TABLE level_base AS
+                             SELECT id, iif(instr(id, '!') > 0,
+                                            substr(id, 0, instr(id, '!')),
+                                            id) AS base_id
+                             FROM Level
+                             WHERE cycles != 0""")
+        self.cur.execute(r"CREATE INDEX temp.level_base_idx ON level_base (base_id, id)")
+
+        self.cur.execute(r"""CREATE TEMP TABLE component_index AS
+                             SELECT level_id, rowid AS component_id FROM Component""")
+        self.cur.execute(r"CREATE INDEX temp.component_index_idx ON component_index (level_id, component_id)")
+
+        for table in ['Member', 'Pipe', 'Annotation']:
+            self.cur.execute(fr"""CREATE TEMP TABLE {table}_index AS
+                                  SELECT component_id, rowid AS row_id FROM {table}""")
+            self.cur.execute(fr"CREATE INDEX temp.{table}_index_idx ON {table}_index (component_id, row_id)")
 
     def read_solutions(self, ids: list|None, pareto_only: bool) -> Iterable:
         # we use cycles != 0 as a good proxy for finished
@@ -77,6 +127,11 @@ class SaveReadBackend(AbstractReadBackend):
         if not ids:
             query += " AND id not like 'custom-%'"
             params = ()
+        elif self.indexed:
+            query += f""" AND id in (SELECT id
+                                     FROM temp.level_base
+                                     WHERE base_id in ({','.join('?' * len(ids))}))"""
+            params = ids
         else:
             query += f""" AND iif(instr(id, '!') > 0,
                                   substr(id, 0, instr(id, '!')),
@@ -99,9 +154,32 @@ class SaveReadBackend(AbstractReadBackend):
                          "WHERE level_id=? "
                          "ORDER BY rowid",
                          (sol_id,))
-        return self.cur.fetchall()
+        components = self.cur.fetchall()
+        if self.indexed:
+            self._prefetch(sol_id)
+        return components
+
+    def _prefetch(self, sol_id):
+        """Loads members, pipes and annotations of all the components of `sol_id`, one joined query per table"""
+        def fetch_grouped(columns, table):
+            self.cur.execute(fr"""SELECT t.component_id, {columns}
+                                  FROM temp.component_index c
+                                  JOIN temp.{table}_index i ON i.component_id = c.component_id
+                                  JOIN {table} t ON t.rowid = i.row_id
+                                  WHERE c.level_id = ?
+                                  ORDER BY t.component_id, t.rowid""", (sol_id,))
+            row_type = Row.make_type(*(column[0] for column in self.cur.description[1:]))
+            return {comp_id: [row_type(row[1:]) for row in rows]
+                    for comp_id, rows in itertools.groupby(self.cur, operator.itemgetter(0))}
+
+        self.members = fetch_grouped('t.type, t.arrow_dir, t.choice, t.layer, t.x, t.y, t.element_type, t.element',
+                                     'Member')
+        self.pipes = fetch_grouped('t.output_id, t.x, t.y', 'Pipe')
+        self.annotations = fetch_grouped('t.output_id, t.expanded, t.x, t.y, t.annotation', 'Annotation')
 
     def read_members(self, comp_id):
+        if self.indexed:
+            return self.members.get(comp_id, [])
         return self.cur.execute("SELECT type, arrow_dir, choice, layer, x, y, element_type, element "
                                 "FROM Member "
                                 "WHERE component_id=? "
@@ -109,6 +187,8 @@ class SaveReadBackend(AbstractReadBackend):
                                 (comp_id,))
 
     def read_pipes(self, comp_id, component_type=None):
+        if self.indexed:
+            return self.pipes.get(comp_id, [])
         return self.cur.execute("SELECT output_id, x, y "
                                 "FROM Pipe "
                                 "WHERE component_id=? "
@@ -116,6 +196,8 @@ class SaveReadBackend(AbstractReadBackend):
                                 (comp_id,))
 
     def read_annotations(self, comp_id):
+        if self.indexed:
+            return self.annotations.get(comp_id, [])
         return self.cur.execute("SELECT output_id, expanded, x, y, annotation "
                                 "FROM Annotation "
                                 "WHERE component_id=?",
@@ -129,13 +211,13 @@ class SolnetReadBackend(AbstractReadBackend):
 
     @classmethod
     def make_seed_map(cls):
-        with open('config/seeds.csv') as levelscsv:
-            reader = csv.DictReader(levelscsv, skipinitialspace=True)
-            return {(row['type'], int(row['output'])):
-                    cls.Point(int(row['x']), int(row['y']))
-                    for row in reader}
+        return {seed_id: cls.Point(*seed) for seed_id, seed in get_level_registry().seeds.items()}
 
     def __init__(self) -> None:
+        # deferred, so that the other backends don't need psycopg2
+        import psycopg2
+        import psycopg2.extras
+
         self.conn = psycopg2.connect(dbname='solutionnet')
         self.conn.set_session(readonly=True)
         self.cur = self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
@@ -163,6 +245,45 @@ class SolnetReadBackend(AbstractReadBackend):
             self.cur.execute(query + ' ORDER BY 1', params)
             return self.cur.fetchall()
 
+    def read_layout_hashes(self, ids: list) -> dict:
+        # members and pipes are unordered in the db, so they're sorted before hashing,
+        # rows are hashed as ROW(...)::text, which tells NULLs and empty strings apart.
+        # The same layout in another level is another solution.
+        if not ids:
+            where, params = '', ()
+        elif isinstance(ids[0], int):
+            where, params = 'WHERE solution_id in %s', (tuple(ids),)
+        else:
+            where, params = r"""WHERE solution_id in (SELECT solution_id
+                                                     FROM solutions NATURAL JOIN levels
+                                                     WHERE internal_name in %s)""", (tuple(ids),)
+
+        self.cur.execute(rf"""WITH c AS (SELECT component_id, solution_id, type, x, y
+                                         FROM components
+                                         {where}),
+                                   m AS (SELECT component_id,
+                                                string_agg(ROW(mm.type, mm.arrow_dir, mm.choice, mm.layer, mm.x, mm.y,
+                                                               mm.element_type, mm.element)::text,
+                                                           ';' ORDER BY mm.type, mm.arrow_dir, mm.choice, mm.layer,
+                                                                        mm.x, mm.y, mm.element_type, mm.element) AS members
+                                         FROM members mm JOIN c USING (component_id)
+                                         GROUP BY component_id),
+                                   p AS (SELECT component_id,
+                                                string_agg(ROW(pp.output_id, pp.x, pp.y)::text,
+                                                           ';' ORDER BY pp.output_id, pp.x, pp.y) AS pipes
+                                         FROM pipes pp JOIN c USING (component_id)
+                                         GROUP BY component_id)
+                              SELECT c.solution_id,
+                                     md5(s.level_id || '|' ||
+                                         string_agg(ROW(c.type, c.x, c.y, m.members, p.pipes)::text,
+                                                    '|' ORDER BY c.type, c.x, c.y, m.members, p.pipes)) AS layout
+                              FROM c
+                              JOIN solutions s USING (solution_id)
+                              LEFT JOIN m USING (component_id)
+                              LEFT JOIN p USING (component_id)
+                              GROUP BY c.solution_id, s.level_id""", params)
+        return {row['solution_id']: row['layout'] for row in self.cur}
+
     def read_components(self, sol_id) -> Iterable:
         self.cur.execute(r"""  SELECT component_id, type, x, y
                                  FROM components
@@ -173,15 +294,20 @@ class SolnetReadBackend(AbstractReadBackend):
     def read_members(self, comp_id):
         self.cur.execute(r"""SELECT type, arrow_dir, choice, layer, x, y, element_type, element
                              FROM members
-                             WHERE component_id = %s""", (comp_id,))
+                             WHERE component_id = %s
+                             ORDER BY member_id""", (comp_id,))
         return self.cur.fetchall()
 
     def read_pipes(self, comp_id, component_type=None):
         self.cur.execute(r"""SELECT output_id, x, y
                            FROM pipes
                            WHERE component_id = %s
-                           ORDER BY output_id""", (comp_id,))
-        pipes = itertools.groupby(self.cur, operator.itemgetter('output_id'))
+                           ORDER BY output_id, pipe_id""", (comp_id,))
+        return self._pipes_from_rows(self.cur, component_type)
+
+    def _pipes_from_rows(self, rows, component_type) -> list:
+        """rows: (output_id, x, y) sorted by output_id, returns them as they must be written"""
+        pipes = itertools.groupby(rows, operator.itemgetter('output_id'))
         seeds = []
         reordered_pipes = []
         for out_id, raw_pipe in pipes:
@@ -209,7 +335,7 @@ class SolnetReadBackend(AbstractReadBackend):
             self.field[pt.y][pt.x] = value
 
         def find_neighbours(self, curr: 'SolnetReadBackend.Point',
-                            include_end: 'SolnetReadBackend.Point'|None = None):
+                            include_end: 'SolnetReadBackend.Point|None' = None):
             neighbours = [SolnetReadBackend.Point(curr.x+dx, curr.y+dy)
                     for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]
                     if self.field[curr.y+dy][curr.x+dx] == 'p' or (curr.x+dx, curr.y+dy) == include_end]
@@ -327,16 +453,265 @@ class SolnetReadBackend(AbstractReadBackend):
             # field.print()
 
     def read_annotations(self, comp_id):
-        pass
+        return []
 
     def close(self):
         self.conn.close()
 
+class PooledSolnetReadBackend(SolnetReadBackend):
+    """Reads whole solutions on several read-only connections at once, in chunks of consecutive ids,
+    and hands them out in the order given to prefetch()"""
+
+    def __init__(self, connections=4, chunk_size=50) -> None:
+        import psycopg2.pool
+        from concurrent.futures import ThreadPoolExecutor
+
+        super().__init__()
+        self.pool = psycopg2.pool.ThreadedConnectionPool(1, connections, dbname='solutionnet')
+        self.executor = ThreadPoolExecutor(connections)
+        self.chunk_size = chunk_size
+        self.window = 2 * connections
+        self.chunks: Iterable = iter([])
+        self.pending: collections.deque = collections.deque()
+        self.ready: dict = {}
+        self.positions: dict = {} # sol_id -> position in the prefetch order
+        self.next_position = 0      # the prefetched solutions before it were read or skipped
+
+        self.members: dict = {}
+        self.pipes: dict = {}
+
+    def prefetch(self, sol_ids: list):
+        sol_ids = list(sol_ids)
+        self.positions = {sol_id: i for i, sol_id in enumerate(sol_ids)}
+        self.next_position = 0
+        self.chunks = (sol_ids[i:i+self.chunk_size] for i in range(0, len(sol_ids), self.chunk_size))
+        self._fill_window()
+
+    def _fill_window(self):
+        while len(self.pending) < self.window:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.pending.append(self.executor.submit(self._read_chunk, chunk))
+
+    def _read_chunk(self, sol_ids: list) -> dict:
+        import psycopg2.extras
+
+        conn = self.pool.getconn()
+        try:
+            conn.set_session(readonly=True)
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                cur.execute(r"""  SELECT component_id, solution_id, type, x, y
+                                    FROM components
+                                   WHERE solution_id = ANY(%s)
+                                ORDER BY solution_id, component_id""", (sol_ids,))
+                components = cur.fetchall()
+                comp_types = {component['component_id']: component['type'] for component in components}
+
+                cur.execute(r"""  SELECT component_id, type, arrow_dir, choice, layer, x, y, element_type, element
+                                    FROM members
+                                   WHERE component_id = ANY(%s)
+                                ORDER BY component_id, member_id""", (list(comp_types),))
+                member_type = Row.make_type('type', 'arrow_dir', 'choice', 'layer', 'x', 'y', 'element_type', 'element')
+                members = {comp_id: [member_type(row[1:]) for row in rows]
+                           for comp_id, rows in itertools.groupby(cur, operator.itemgetter('component_id'))}
+
+                cur.execute(r"""  SELECT component_id, output_id, x, y
+                                    FROM pipes
+                                   WHERE component_id = ANY(%s)
+                                ORDER BY component_id, output_id, pipe_id""", (list(comp_types),))
+                pipes = {comp_id: self._pipes_from_rows(rows, comp_types[comp_id])
+                         for comp_id, rows in itertools.groupby(cur, operator.itemgetter('component_id'))}
+            conn.rollback()
+        finally:
+            self.pool.putconn(conn)
+
+        solutions = {sol_id: ([], {}, {}) for sol_id in sol_ids}
+        for component in components:
+            sol_components, sol_members, sol_pipes = solutions[component['solution_id']]
+            comp_id = component['component_id']
+            sol_components.append(component)
+            sol_members[comp_id] = members.get(comp_id, [])
+            sol_pipes[comp_id] = pipes.get(comp_id, [])
+        return solutions
+
+    def read_components(self, sol_id) -> Iterable:
+        position = self.positions.get(sol_id, -1)
+        if position < self.next_position:
+            # not prefetched, or already skipped, read it on the main connection
+            self.members, self.pipes = {}, {}
+            return super().read_components(sol_id)
+
+        while sol_id not in self.ready and self.pending:
+            self.ready.update(self.pending.popleft().result())
+            self._fill_window()
+
+        # the prefetched solutions before this one were skipped, nothing will wait for them anymore
+        for skipped in [skipped for skipped in self.ready if self.positions[skipped] < position]:
+            del self.ready[skipped]
+        self.next_position = position + 1
+
+        components, self.members, self.pipes = self.ready.pop(sol_id)
+        return components
+
+    def read_members(self, comp_id):
+        if comp_id in self.members:
+            return self.members[comp_id]
+        return super().read_members(comp_id)
+
+    def read_pipes(self, comp_id, component_type=None):
+        if comp_id in self.pipes:
+            return self.pipes[comp_id]
+        return super().read_pipes(comp_id, component_type)
+
+    def close(self):
+        for future in self.pending:
+            future.cancel()
+        self.executor.shutdown()
+        self.pool.closeall()
+        super().close()
+
+class MirrorReadBackend(SolnetReadBackend):
+    """Serves the SolutionNet reads from the local columnar mirror made by solnet_mirror.py, no db needed"""
+    SolutionRow = Row.make_type('solution_id', 'internal_name', 'username', 'description',
+                                'cycle_count', 'symbol_count', 'reactor_count')
+    ComponentRow = Row.make_type('component_id', 'type', 'x', 'y')
+    MemberRow = Row.make_type('type', 'arrow_dir', 'choice', 'layer', 'x', 'y', 'element_type', 'element')
+    PipeRow = Row.make_type('output_id', 'x', 'y')
+
+    def __init__(self, folder='data/mirror') -> None:
+        from solnet_mirror import SolnetMirror
+
+        self.mirror = SolnetMirror(folder)
+        self.seeds = self.make_seed_map()
+        self.solutions = self.mirror.tables['solutions']
+        self.components = self.mirror.tables['components']
+        self.level_names = dict(zip(self.mirror.values('levels', 'level_id'), self.mirror.texts('levels', 'internal_name')))
+        self.user_names = dict(zip(self.mirror.values('users', 'user_id'), self.mirror.texts('users', 'username')))
+        # component_id -> component row, for the components of the last solution read
+        self.component_rows: dict = {}
+
+    def read_solutions(self, ids: list, pareto_only: bool) -> Iterable:
+        import numpy as np
+
+        if not ids:
+            rows = np.arange(len(self.solutions['solution_id']))
+        elif isinstance(ids[0], int):
+            rows = np.flatnonzero(np.isin(self.solutions['solution_id'], ids))
+        else:
+            level_ids = [level_id for level_id, name in self.level_names.items() if name in ids]
+            rows = np.flatnonzero(np.isin(self.solutions['level_id'], level_ids))
+
+        columns = [self.mirror.values('solutions', name, rows)
+                   for name in ['solution_id', 'level_id', 'user_id', 'cycle_count', 'symbol_count', 'reactor_count']]
+        # like the db's join on levels and users
+        solutions = [self.SolutionRow((sol_id, self.level_names[level_id], self.user_names[user_id],
+                                       self.mirror.text('solutions', 'description', row), c, s, r))
+                     for row, sol_id, level_id, user_id, c, s, r in zip(rows.tolist(), *columns)
+                     if level_id in self.level_names and user_id in self.user_names]
+
+        if pareto_only:
+            solutions.sort(key=operator.itemgetter('internal_name', 'solution_id'))
+            level_sols = itertools.groupby(solutions, operator.itemgetter('internal_name'))
+            return self.clean_to_pareto(level_sols)
+        else:
+            return solutions
+
+    def read_layout_hashes(self, ids: list) -> dict:
+        """Same grouping as the db query, members, pipes and components are sorted before hashing"""
+        sol_levels = {solution[0]: solution[1] for solution in self.read_solutions(ids, pareto_only=False)}
+        sol_ids = list(sol_levels)
+        components = list(zip(*(self.mirror.values('components', name) for name in ['type', 'x', 'y'])))
+        members = list(zip(*(self.mirror.values('members', name) for name in self.MemberRow.fields)))
+        pipes = list(zip(*(self.mirror.values('pipes', name) for name in self.PipeRow.fields)))
+        member_offsets = self.components['member_offsets'].tolist()
+        pipe_offsets = self.components['pipe_offsets'].tolist()
+        component_offsets = self.solutions['component_offsets'].tolist()
+        rows = self.solutions['solution_id'].searchsorted(sol_ids).tolist()
+
+        hashes = {}
+        for sol_id, row in zip(sol_ids, rows):
+            # reprs sort even with NULLs in them
+            layout = sorted(repr((components[j], sorted(map(repr, members[member_offsets[j]:member_offsets[j+1]])),
+                                  sorted(map(repr, pipes[pipe_offsets[j]:pipe_offsets[j+1]]))))
+                            for j in range(component_offsets[row], component_offsets[row+1]))
+            hashes[sol_id] = hashlib.md5(repr((sol_levels[sol_id], layout)).encode()).hexdigest()
+        return hashes
+
+    def read_components(self, sol_id) -> Iterable:
+        import numpy as np
+
+        row = int(np.searchsorted(self.solutions['solution_id'], sol_id))
+        if row == len(self.solutions['solution_id']) or self.solutions['solution_id'][row] != sol_id:
+            self.component_rows = {}
+            return []
+
+        start, end = self.solutions['component_offsets'][row:row+2].tolist()
+        component_ids = self.mirror.values('components', 'component_id', slice(start, end))
+        self.component_rows = {comp_id: start + i for i, comp_id in enumerate(component_ids)}
+        return [self.ComponentRow(component)
+                for component in zip(*(self.mirror.values('components', name, slice(start, end))
+                                       for name in self.ComponentRow.fields))]
+
+    def _slice(self, table: str, offsets_name: str, comp_id, columns: list) -> list:
+        row = self.component_rows[comp_id]
+        start, end = self.components[offsets_name][row:row+2].tolist()
+        return list(zip(*(self.mirror.values(table, name, slice(start, end)) for name in columns)))
+
+    def read_members(self, comp_id):
+        return [self.MemberRow(member)
+                for member in self._slice('members', 'member_offsets', comp_id, self.MemberRow.fields)]
+
+    def read_pipes(self, comp_id, component_type=None):
+        rows = [self.PipeRow(pipe) for pipe in self._slice('pipes', 'pipe_offsets', comp_id, self.PipeRow.fields)]
+        return self._pipes_from_rows(rows, component_type)
+
+    def close(self):
+        pass
+
 class ExportReadBackend(AbstractReadBackend):
+    """Reads the `<sol_id>.txt` files ExportWriteBackend writes, and the duplicates it recorded, without schem.
+    Solutions after the first in a file get `<file>!<n>` ids, files not named by id are read after the others."""
+    ComponentRow = Row.make_type('component_id', 'type', 'x', 'y')
+    MemberRow = Row.make_type('type', 'arrow_dir', 'choice', 'layer', 'x', 'y', 'element_type', 'element')
+    AnnotationRow = Row.make_type('output_id', 'expanded', 'x', 'y', 'annotation')
 
     def __init__(self, folder:str, name2id) -> None:
         self.folder = folder
         self.name2id = name2id
+        # sol_id -> (file, byte offset of its SOLUTION line)
+        self.locations: dict = {}
+        self.next_comp_id = 0
+        # comp_id -> (members, pipes, annotations), for the components of the last solution read
+        self.component_data: dict = {}
+
+    # a whole field in quotes, a name that only starts with one (`'Tis done`) is not quoted
+    QUOTED_FIELD = re.compile(r"'((?:[^']|'')*)'(?=,|$)")
+
+    @classmethod
+    def split_fields(cls, line: str) -> list:
+        """Fields are quoted with ' when they contain a comma or start with ', quotes inside are doubled"""
+        if "'" not in line:
+            return line.split(',')
+        fields = []
+        pos = 0
+        while True:
+            quoted = cls.QUOTED_FIELD.match(line, pos)
+            if quoted:
+                fields.append(quoted[1].replace("''", "'"))
+                pos = quoted.end()
+            else:
+                end = line.find(',', pos)
+                end = end if end != -1 else len(line)
+                fields.append(line[pos:end])
+                pos = end
+            if pos == len(line):
+                return fields
+            pos += 1  # the comma
+
+    @staticmethod
+    def unescape(s: str) -> str:
+        return s.replace("\\n", "\n").replace("\\r", "\r")
 
     def read_solutions(self, ids: list, pareto_only: bool) -> Iterable:
         sols = self._read_solution_files(ids)
@@ -347,27 +722,84 @@ class ExportReadBackend(AbstractReadBackend):
             return sols
 
     def _read_solution_files(self, ids: list) -> Iterable:
-        sol_files = sorted(Path(self.folder).glob('*.txt'), key=lambda f: int(f.stem))
-        for sol_file in sol_files:
-            sol_id = int(sol_file.stem)
-            if not ids or (sol_id in ids):
-                with sol_file.open('r') as f:
-                    sol = schem.Solution(f.readline())
-                    assert sol.expected_score
-                yield sol_id, self.name2id[sol.level.name], sol.author, sol.name, \
-                      sol.expected_score[0], sol.expected_score[2], sol.expected_score[1]
+        sol_files = {f.stem: f for f in Path(self.folder).glob('*.txt')}
+        duplicates = self._read_duplicates()
+        stems = sorted(sol_files.keys() | duplicates.keys(),
+                       key=lambda stem: (0, int(stem), '') if stem.isdigit() else (1, 0, stem))
+        for stem in stems:
+            file_id = int(stem) if stem.isdigit() else stem
+            if ids and file_id not in ids:
+                continue
+            # a file's duplicates come after the solutions written out in it
+            headers = itertools.chain(self._read_headers(sol_files[stem]) if stem in sol_files else (),
+                                      duplicates.get(stem, ()))
+            for n, (location, header) in enumerate(headers):
+                sol_id = file_id if n == 0 else f'{file_id}!{n}'
+                self.locations[sol_id] = location
+                level_name, author, score, *name = self.split_fields(header)
+                c, r, s = map(int, score.split('-'))
+                yield sol_id, self.name2id[level_name], author, name[0] if name else None, c, s, r
+
+    @staticmethod
+    def _read_headers(sol_file: Path) -> Iterable:
+        """((file, offset), header) of every SOLUTION line in `sol_file`"""
+        with sol_file.open('rb') as f:
+            offset = 0
+            for line in f:
+                if line.startswith(b'SOLUTION:'):
+                    yield (sol_file, offset), line[9:].decode().rstrip('\r\n')
+                offset += len(line)
+
+    def _read_duplicates(self) -> dict:
+        """file name -> [((file, offset), header)] of the duplicates ExportWriteBackend recorded,
+        each one points at the solution its layout is read from"""
+        duplicates = collections.defaultdict(list)
+        duplicates_file = Path(self.folder) / 'duplicates.psv'
+        if duplicates_file.exists():
+            with duplicates_file.open() as f:
+                for line in f:
+                    file_name, reference, header = line.rstrip('\r\n').split('|', 2)
+                    original_file, offset = reference.rsplit(':', 1)
+                    duplicates[file_name].append(((Path(self.folder) / original_file, int(offset)),
+                                                  header.removeprefix('SOLUTION:')))
+        return duplicates
 
     def read_components(self, sol_id) -> Iterable:
-        return []
+        self.component_data = {}
+        components = []
+        sol_file, offset = self.locations[sol_id]
+        with sol_file.open('rb') as f:
+            f.seek(offset)
+            f.readline() # our SOLUTION line
+            for line in f:
+                kind, _, rest = line.decode().rstrip('\r\n').partition(':')
+                if kind == 'SOLUTION':
+                    break
+                elif kind == 'COMPONENT':
+                    comp_type, x, y, *_ = self.split_fields(rest)
+                    comp_id = self.next_comp_id
+                    self.next_comp_id += 1
+                    components.append(self.ComponentRow((comp_id, comp_type, int(x), int(y))))
+                    members, pipes, annotations = self.component_data[comp_id] = ([], [], [])
+                elif kind == 'MEMBER':
+                    member_type, *values = self.split_fields(rest)
+                    members.append(self.MemberRow((member_type, *map(int, values))))
+                elif kind == 'PIPE':
+                    pipes.append(tuple(map(int, rest.split(','))))
+                elif kind == 'ANNOTATION':
+                    # the text is written quoted as is, quotes and commas in it included
+                    *values, text = rest.split(',', 4)
+                    annotations.append(self.AnnotationRow((*map(int, values), self.unescape(text[1:-1]))))
+        return components
 
     def read_members(self, comp_id):
-        return []
+        return self.component_data[comp_id][0]
 
     def read_pipes(self, comp_id, component_type=None):
-        return []
+        return self.component_data[comp_id][1]
 
     def read_annotations(self, comp_id):
-        return []
+        return self.component_data[comp_id][2]
 
     def close(self):
         pass
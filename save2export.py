@@ -1,25 +1,27 @@
 #!/usr/bin/python3
 
 import argparse
+import os
 import pathlib
+import shutil
 
 from write_backends import ExportWriteBackend, make_level_dicts
 from read_backends import SaveReadBackend
 
 
-def main():
+def export_save(savefile, player_name, folder, level_names=None, indexed=True, validate=False, check_precog=False):
     id2name, name2id = make_level_dicts()
 
-    read_backend = SaveReadBackend(args.file)
-    write_backend = ExportWriteBackend('exports', id2name)
+    read_backend = SaveReadBackend(savefile, indexed)
+    write_backend = ExportWriteBackend(folder, id2name)
 
-    level_ids = [name2id[lev] for lev in args.levels] if args.levels else None
+    level_ids = [name2id[lev] for lev in level_names] if level_names else None
     levels = read_backend.read_solutions(level_ids, pareto_only=False)
 
     for level in levels:
         # CE extra sols are stored as `id!progressive`
         clean_id = level['id'].split('!')[0]
-        write_backend.write_solution(clean_id, args.player_name, level['cycles'],
+        write_backend.write_solution(clean_id, player_name, level['cycles'],
                                     level['symbols'], level['reactors'], level['mastered'])
 
         components = read_backend.read_components(level["id"])
@@ -36,14 +38,66 @@ def main():
             annotations = read_backend.read_annotations(comp_id)
             write_backend.write_annotations(annotations)
 
-        write_backend.commit(clean_id, args.schem, args.check_precog)
+        write_backend.commit(clean_id, validate, check_precog)
     write_backend.close()
+    read_backend.close()
+    return savefile
+
+def export_saves_dir(saves_dir: pathlib.Path, export_dir: pathlib.Path, workers=None, level_names=None,
+                     indexed=True, validate=False, check_precog=False):
+    """
+    Exports every `saves_dir/<player>/**/<save>.user` to `export_dir/<player>/**/<save>.export/`.
+    The folders must not end in .user, or the `**/*.user` globs of the save readers would pick them up.
+    A save that fails to export is reported and skipped, the others carry on.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    jobs = []
+    for player_path in sorted(p for p in saves_dir.iterdir() if p.is_dir()):
+        for save in player_path.glob('**/*.user'):
+            folder = export_dir / player_path.name / save.relative_to(player_path).with_suffix('.export')
+            jobs.append((save, player_path.name, folder))
+    # every worker empties its own folder, none can sit inside another's
+    folders = {folder for _, _, folder in jobs}
+    for save, _, folder in jobs:
+        if any(parent in folders for parent in folder.parents):
+            raise ValueError(f'{save} would be exported inside the export of another save')
+    # biggest saves first, so they don't end up alone at the tail of the run
+    jobs.sort(key=lambda job: job[0].stat().st_size, reverse=True)
+
+    shutil.rmtree(export_dir, ignore_errors=True)
+    for _, _, folder in jobs:
+        os.makedirs(folder.parent, exist_ok=True)
+
+    failed = []
+    with ProcessPoolExecutor(workers) as executor:
+        futures = {executor.submit(export_save, save, player, folder, level_names, indexed, validate, check_precog): save
+                   for save, player, folder in jobs}
+        for future in as_completed(futures):
+            try:
+                print(f'Exported {future.result()}')
+            except Exception as e:
+                failed.append(futures[future])
+                print(f'Skipped {futures[future]}: {type(e).__name__}: {e}')
+    if failed:
+        print(f'{len(failed)} of {len(jobs)} saves failed to export')
+
+def main():
+    if args.saves_dir:
+        export_saves_dir(args.saves_dir, pathlib.Path('exports'), args.jobs, args.levels,
+                         args.indexed, args.schem, args.check_precog)
+    else:
+        export_save(args.file, args.player_name, 'exports', args.levels, args.indexed, args.schem, args.check_precog)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-f", "--file", type=pathlib.Path, nargs="?", default="saves/12345ieee/000.user")
     parser.add_argument("-n", "--player-name", default="12345ieee")
+    parser.add_argument("-d", "--saves-dir", type=pathlib.Path, nargs="?", const="saves",
+                        help="export every save in <dir>/<player>/, player names are taken from the folders")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes for --saves-dir")
     parser.add_argument("-l", "--levels", nargs='+')
+    parser.add_argument("--indexed", default=True, action=argparse.BooleanOptionalAction)
     parser.add_argument("-s", "--schem", default=False, action=argparse.BooleanOptionalAction)
     parser.add_argument("--check-precog", default=False, action=argparse.BooleanOptionalAction)
     args = parser.parse_args()
@@ -7,12 +7,40 @@ function check {
     time python -u ./mover_solnet.py -s --check -e exports_checked${suffix} |& tee log${suffix}.log
 }
 
+function resume {
+    # journaled, rerunning after a crash or ^C picks up where check stopped
+    time python -u ./mover_solnet.py -s --check -e exports_checked${suffix} --resume |& tee -a log${suffix}.log
+}
+
 function pareto {
     # TODO: this collapses same-name levels to one
     ./mover_solnet.py -e exports_temp${suffix} --read-from-folder exports_checked${suffix} --pareto
     mkdir exports_pareto${suffix}
-    find exports_temp${suffix} -name '*.txt' -execdir cp ../exports_checked${suffix}/{} ../exports_pareto${suffix} \;
+    # a --dedup duplicate has no file of its own in exports_checked, it was rebuilt from its original's layout
+    for f in exports_temp${suffix}/*.txt; do
+        checked=exports_checked${suffix}/$(basename "$f")
+        cp "$([ -e "$checked" ] && echo "$checked" || echo "$f")" exports_pareto${suffix}
+    done
     rm -r exports_temp${suffix}
 }
 
+function pooled {
+    # needs the local db from solnet2save.sh init, the pooled reader must export exactly what a single connection does
+    ./mover_solnet.py -e exports_single${suffix}
+    ./mover_solnet.py -e exports_pooled${suffix} --connections 4
+    diff -r exports_single${suffix} exports_pooled${suffix}
+}
+
+function sharded {
+    # needs the local db, N shards run as local processes, merged back they must match a single run
+    shards=${SHARDS:-4}
+    for i in $(seq 0 $((shards - 1))); do
+        ./mover_solnet.py -e exports_shard${i}${suffix} --shard $i/$shards > /dev/null &
+    done
+    wait
+    ./merge_shards.py exports_sharded${suffix} $(seq -f "exports_shard%g${suffix}" 0 $((shards - 1)))
+    ./mover_solnet.py -e exports_single${suffix} > /dev/null
+    diff -r exports_single${suffix} exports_sharded${suffix}
+}
+
 pareto
\ No newline at end of file
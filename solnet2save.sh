@@ -13,7 +13,15 @@ function transfer {
     echo "Filling save"
 
     cp data/{new,solnet}.user
-    ./solnet_mover.py -s data/solnet.user --no-replace-sols
+    ./mover_solnet.py -f data/solnet.user --no-replace-sols
+}
+
+# Add the solutions uploaded since the save was filled
+function sync {
+    echo "Syncing save"
+
+    [ -f data/solnet.user ] || cp data/{new,solnet}.user
+    ./mover_solnet.py -f data/solnet.user --no-replace-sols --incremental
 }
 
 transfer
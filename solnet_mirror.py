@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+import argparse
+import array
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+MIRROR_DIR = Path('data/mirror')
+
+"""
+Columnar copy of the SolutionNet tables, one .npy per column, memory-mapped on load.
+Components, members and pipes are sorted by solution and component, so every solution and component
+owns a contiguous slice of the table below it:
+    solutions[i] -> components[solutions/component_offsets[i] : solutions/component_offsets[i+1]]
+    components[j] -> members[components/member_offsets[j] : ...], pipes[components/pipe_offsets[j] : ...]
+Strings are either dictionary-encoded (<column>.json + int codes) or utf-8 blobs (<column>.bin + offsets).
+Columns holding NULLs get a <column>.nulls.npy mask, the value under it is a placeholder.
+Components of no solution, and their members and pipes, can't be read from the db either and are left out.
+"""
+
+# table -> (query, [(column, kind)]), kinds: int, code (dictionary-encoded string), text (blob)
+TABLES = {
+    'levels': (r"""SELECT level_id, internal_name FROM levels ORDER BY level_id""",
+               [('level_id', 'int'), ('internal_name', 'text')]),
+    'users': (r"""SELECT user_id, username FROM users ORDER BY user_id""",
+              [('user_id', 'int'), ('username', 'text')]),
+    'solutions': (r"""SELECT solution_id, level_id, user_id, cycle_count, symbol_count, reactor_count, description
+                      FROM solutions ORDER BY solution_id""",
+                  [('solution_id', 'int'), ('level_id', 'int'), ('user_id', 'int'),
+                   ('cycle_count', 'int'), ('symbol_count', 'int'), ('reactor_count', 'int'), ('description', 'text')]),
+    'components': (r"""SELECT component_id, solution_id, type, x, y
+                       FROM components
+                       WHERE solution_id IN (SELECT solution_id FROM solutions)
+                       ORDER BY solution_id, component_id""",
+                   [('component_id', 'int'), ('solution_id', 'int'), ('type', 'code'), ('x', 'int'), ('y', 'int')]),
+    'members': (r"""SELECT m.component_id, m.type, m.arrow_dir, m.choice, m.layer, m.x, m.y, m.element_type, m.element
+                    FROM members m JOIN components c USING (component_id)
+                    WHERE c.solution_id IN (SELECT solution_id FROM solutions)
+                    ORDER BY c.solution_id, m.component_id, m.member_id""",
+                [('component_id', 'int'), ('type', 'code'), ('arrow_dir', 'int'), ('choice', 'int'), ('layer', 'int'),
+                 ('x', 'int'), ('y', 'int'), ('element_type', 'int'), ('element', 'int')]),
+    'pipes': (r"""SELECT p.component_id, p.output_id, p.x, p.y
+                  FROM pipes p JOIN components c USING (component_id)
+                  WHERE c.solution_id IN (SELECT solution_id FROM solutions)
+                  ORDER BY c.solution_id, p.component_id, p.output_id, p.pipe_id""",
+              [('component_id', 'int'), ('output_id', 'int'), ('x', 'int'), ('y', 'int')]),
+}
+
+# backslash escapes of the COPY text format, NULL is a bare \N
+COPY_ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+
+def unescape(value: str) -> str:
+    return re.sub(r'\\(.)', lambda m: COPY_ESCAPES.get(m[1], m[1]), value) if '\\' in value else value
+
+class CopySink:
+    """Target of COPY ... TO STDOUT, hands every row to `on_row` as it arrives instead of holding the table"""
+
+    def __init__(self, on_row) -> None:
+        self.on_row = on_row
+        self.partial = b''
+
+    def write(self, data) -> int:
+        lines = (self.partial + (data.encode() if isinstance(data, str) else data)).split(b'\n')
+        self.partial = lines.pop()
+        for line in lines:
+            self.on_row([None if field == '\\N' else unescape(field) for field in line.decode().split('\t')])
+        return len(data)
+
+def narrowest(column: np.ndarray) -> np.ndarray:
+    """int32 if every value fits, the ids can outgrow it"""
+    info = np.iinfo(np.int32)
+    if len(column) and (column.min() < info.min or column.max() > info.max):
+        return column
+    return column.astype(np.int32)
+
+def copy_table(cur, query: str, columns: list, folder: Path) -> int:
+    values = [array.array('q') if kind != 'text' else [] for _, kind in columns]
+    nulls = [array.array('b') for _ in columns]
+    vocabularies = [{} if kind == 'code' else None for _, kind in columns]
+    rows = 0
+
+    def add_row(row):
+        nonlocal rows
+        rows += 1
+        for value, (_, kind), column, column_nulls, vocabulary in zip(row, columns, values, nulls, vocabularies):
+            column_nulls.append(value is None)
+            if kind == 'int':
+                column.append(int(value) if value is not None else 0)
+            elif kind == 'code':
+                column.append(vocabulary.setdefault(value or '', len(vocabulary)))
+            else:
+                column.append(value or '')
+
+    cur.copy_expert(f'COPY ({query}) TO STDOUT', CopySink(add_row))
+
+    folder.mkdir(parents=True, exist_ok=True)
+    for (name, kind), column, column_nulls, vocabulary in zip(columns, values, nulls, vocabularies):
+        if any(column_nulls):
+            np.save(folder / f'{name}.nulls.npy', np.frombuffer(column_nulls, dtype=np.int8).astype(bool))
+        elif os.path.exists(folder / f'{name}.nulls.npy'):
+            os.remove(folder / f'{name}.nulls.npy')
+        if kind == 'text':
+            encoded = [value.encode() for value in column]
+            with open(folder / f'{name}.bin', 'wb') as f:
+                for value in encoded:
+                    f.write(value)
+            np.save(folder / f'{name}.offsets.npy',
+                    np.concatenate([[0], np.cumsum([len(value) for value in encoded], dtype=np.int64)]).astype(np.int64))
+        else:
+            np.save(folder / f'{name}.npy', narrowest(np.frombuffer(column, dtype=np.int64)))
+            if kind == 'code':
+                with open(folder / f'{name}.json', 'w') as f:
+                    json.dump(sorted(vocabulary, key=vocabulary.get), f)
+    return rows
+
+def make_offsets(parent_ids: np.ndarray, child_parent_ids: np.ndarray) -> np.ndarray:
+    """Both sorted in the same order, returns the (parents + 1,) slice bounds of every parent's children"""
+    parent_rows = {parent_id: i for i, parent_id in enumerate(parent_ids.tolist())}
+    child_rows = np.array([parent_rows[parent_id] for parent_id in child_parent_ids.tolist()], dtype=np.int64)
+    counts = np.bincount(child_rows, minlength=len(parent_ids))
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+def extract(folder: Path = MIRROR_DIR, dbname='solutionnet'):
+    import psycopg2
+
+    conn = psycopg2.connect(dbname=dbname)
+    conn.set_session(readonly=True)
+    sizes = {}
+    with conn.cursor() as cur:
+        for table, (query, columns) in TABLES.items():
+            sizes[table] = copy_table(cur, query, columns, folder / table)
+            print(f'Copied {sizes[table]} {table}')
+    conn.close()
+
+    solution_ids = np.load(folder / 'solutions' / 'solution_id.npy')
+    component_ids = np.load(folder / 'components' / 'component_id.npy')
+    np.save(folder / 'solutions' / 'component_offsets.npy',
+            make_offsets(solution_ids, np.load(folder / 'components' / 'solution_id.npy')))
+    for table in ['members', 'pipes']:
+        np.save(folder / 'components' / f'{table[:-1]}_offsets.npy',
+                make_offsets(component_ids, np.load(folder / table / 'component_id.npy')))
+
+    with open(folder / 'mirror.json', 'w') as f:
+        json.dump({'dbname': dbname, 'rows': sizes}, f, indent=1)
+
+class SolnetMirror:
+    """The mirror columns, memory-mapped"""
+
+    def __init__(self, folder: Path = MIRROR_DIR) -> None:
+        self.folder = Path(folder)
+        if not (self.folder / 'mirror.json').exists():
+            raise FileNotFoundError(f'No SolutionNet mirror in {self.folder}, run solnet_mirror.py first')
+        self.tables = {table: self._load_table(table, columns) for table, (_, columns) in TABLES.items()}
+        self.tables['solutions']['component_offsets'] = self._load('solutions', 'component_offsets')
+        self.tables['components']['member_offsets'] = self._load('components', 'member_offsets')
+        self.tables['components']['pipe_offsets'] = self._load('components', 'pipe_offsets')
+
+    def _load(self, table, name):
+        return np.load(self.folder / table / f'{name}.npy', mmap_mode='r')
+
+    def _load_table(self, table, columns) -> dict:
+        loaded = {}
+        for name, kind in columns:
+            if kind == 'text':
+                path = self.folder / table / f'{name}.bin'
+                loaded[name] = (np.memmap(path, dtype=np.uint8, mode='r') if os.path.getsize(path)
+                                else np.zeros(0, dtype=np.uint8),
+                                self._load(table, f'{name}.offsets'))
+            else:
+                loaded[name] = self._load(table, name)
+                if kind == 'code':
+                    with open(self.folder / table / f'{name}.json') as f:
+                        loaded[f'{name}.vocabulary'] = json.load(f)
+            if (self.folder / table / f'{name}.nulls.npy').exists():
+                loaded[f'{name}.nulls'] = self._load(table, f'{name}.nulls')
+        return loaded
+
+    def is_null(self, table: str, column: str, row: int) -> bool:
+        nulls = self.tables[table].get(f'{column}.nulls')
+        return nulls is not None and bool(nulls[row])
+
+    def values(self, table: str, column: str, rows=slice(None)) -> list:
+        """An int or code column at `rows`, decoded, NULLs as None"""
+        loaded = self.tables[table]
+        values = loaded[column][rows].tolist()
+        if f'{column}.vocabulary' in loaded:
+            vocabulary = loaded[f'{column}.vocabulary']
+            values = [vocabulary[value] for value in values]
+        if f'{column}.nulls' in loaded:
+            values = [None if null else value for value, null in zip(values, loaded[f'{column}.nulls'][rows].tolist())]
+        return values
+
+    def text(self, table: str, column: str, row: int) -> str|None:
+        if self.is_null(table, column, row):
+            return None
+        blob, offsets = self.tables[table][column]
+        return bytes(blob[offsets[row]:offsets[row + 1]]).decode()
+
+    def texts(self, table: str, column: str) -> list:
+        blob, offsets = self.tables[table][column]
+        data = bytes(blob)
+        texts = [data[start:end].decode() for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+        if f'{column}.nulls' in self.tables[table]:
+            texts = [None if null else text for text, null in zip(texts, self.tables[table][f'{column}.nulls'].tolist())]
+        return texts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Copy the SolutionNet database into a local columnar mirror')
+    parser.add_argument("folder", type=Path, nargs="?", default=MIRROR_DIR)
+    parser.add_argument("--dbname", default='solutionnet')
+    args = parser.parse_args()
+
+    extract(args.folder, args.dbname)
@@ -1,33 +1,159 @@
 #!/usr/bin/env python3
 
-import itertools
+import argparse
+import csv
+import json
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from write_backends import make_level_dicts
+from typing import List
+
+import numpy as np
+
+from level_registry import get_level_registry
 
 ARCHIVE_DIR = Path('../spacechem-archive')
 
-def main():
-    id2name, _ = make_level_dicts()
+class ArchiveFrontiers(typing.NamedTuple):
+    """All the archive frontiers packed in flat arrays, level i owns rows offsets[i]:offsets[i+1]"""
+    level_ids: List[str]    # in config order
+    offsets: np.ndarray     # (levels + 1,)
+    scores: np.ndarray      # (solutions, 3) c/r/s
+    flagged: np.ndarray     # (solutions,) bugged or precognitive
+    authors: np.ndarray     # (solutions,) index into author_names
+    author_names: List[str]
 
-    levels = list(id2name.keys())
-    solutions_files = [(p, p.parts[-2].replace('_', '-')) for p in ARCHIVE_DIR.glob('*/*/solutions.psv')]
-    solutions_files.sort(key=lambda s: levels.index(s[1]))
+    def level_index(self) -> np.ndarray:
+        """(solutions,) level index of every row"""
+        return np.repeat(np.arange(len(self.level_ids)), np.diff(self.offsets))
 
-    print('level, solutions, filling fraction')
-    for (solutions_file, db_id) in solutions_files:
-        with open(solutions_file) as sf:
-            raw_scores: list = [line.split('|', 1)[0].replace(',', '').split('/') for line in sf]
-            scores = [tuple(map(int, score)) for score in raw_scores if len(score) == 3]
+def read_solutions_file(solutions_file: Path) -> tuple[list, list, list]:
+    scores, flagged, authors = [], [], []
+    with open(solutions_file) as sf:
+        for line in sf:
+            fields = line.split('|', 2)
+            if len(fields) != 3:
+                continue  # blank or truncated line
+            score, author, _ = fields
+            cycles, reactors, symbols, *flags = score.replace(',', '').split('/')
+            scores.append((int(cycles), int(reactors), int(symbols)))
+            flagged.append(bool(flags))
+            authors.append(author)
+    return scores, flagged, authors
+
+def load_archive(archive_dir: Path = ARCHIVE_DIR, jobs: int|None = None) -> ArchiveFrontiers:
+    id2ordinal = get_level_registry().id2ordinal
+
+    solutions_files = [(p, p.parts[-2].replace('_', '-')) for p in archive_dir.glob('*/*/solutions.psv')]
+    solutions_files.sort(key=lambda s: id2ordinal[s[1]])
+
+    # parsing is CPU bound, threads would just take turns on the GIL
+    with ProcessPoolExecutor(jobs) as executor:
+        parsed = list(executor.map(read_solutions_file, (p for p, _ in solutions_files),
+                                   chunksize=max(1, len(solutions_files) // (4 * (jobs or os.cpu_count() or 1)))))
+
+    sizes = [len(scores) for scores, _, _ in parsed]
+    all_authors = [author for _, _, authors in parsed for author in authors]
+    author_names, author_codes = np.unique(np.array(all_authors, dtype=str), return_inverse=True)
+
+    return ArchiveFrontiers(level_ids=[db_id for _, db_id in solutions_files],
+                            offsets=np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+                            scores=np.array([score for scores, _, _ in parsed for score in scores],
+                                            dtype=np.int64).reshape(-1, 3),
+                            flagged=np.array([flag for _, flagged, _ in parsed for flag in flagged], dtype=bool),
+                            authors=author_codes.reshape(-1).astype(np.int64),
+                            author_names=author_names.tolist())
+
+def level_stats(frontiers: ArchiveFrontiers) -> dict:
+    """Per level arrays, aligned with frontiers.level_ids"""
+    n_levels = len(frontiers.level_ids)
+    sizes = np.diff(frontiers.offsets)
+    level_index = frontiers.level_index()
+
+    # filling fraction: consecutive unflagged scores in the same level, if the reactors don't increase
+    # count the holes in symbols and cycles (keeping the smallest), else count the step as full
+    clean = np.flatnonzero(~frontiers.flagged)
+    this, next = frontiers.scores[clean[:-1]], frontiers.scores[clean[1:]]
+    same_level = level_index[clean[:-1]] == level_index[clean[1:]]
+    holes = np.minimum(np.abs(this[:, 0] - next[:, 0]), np.abs(this[:, 2] - next[:, 2]))
+    steps = np.where(this[:, 1] >= next[:, 1], holes, 1)
+    realistic_paretos = 1 + np.bincount(level_index[clean[:-1]][same_level],
+                                        weights=steps[same_level], minlength=n_levels)
 
-        realistic_paretos = 1
-        for (this, next) in itertools.pairwise(scores):
-            if this[1] >= next[1]:
-                # find the number of holes in symbols and cycles, keep the smallest
-                realistic_paretos += min(abs(this[i] - next[i]) for i in [0, 2])
-            else:
-                realistic_paretos += 1
+    # reduceat can't handle empty levels, they're left out and keep 0 spreads
+    minimums = np.zeros((n_levels, 3), dtype=np.int64)
+    maximums = np.zeros((n_levels, 3), dtype=np.int64)
+    nonempty = sizes > 0
+    if nonempty.any():
+        starts = frontiers.offsets[:-1][nonempty]
+        minimums[nonempty] = np.minimum.reduceat(frontiers.scores, starts, axis=0)
+        maximums[nonempty] = np.maximum.reduceat(frontiers.scores, starts, axis=0)
 
-        print(f'"{id2name[db_id]}", {len(raw_scores)}, {len(raw_scores)/realistic_paretos:.2f}')
+    return {
+        'solutions': sizes,
+        'flagged': np.bincount(level_index, weights=frontiers.flagged, minlength=n_levels).astype(np.int64),
+        'authors': np.bincount(np.unique(level_index * len(frontiers.author_names) + frontiers.authors)
+                               // max(len(frontiers.author_names), 1), minlength=n_levels),
+        'filling_fraction': sizes / realistic_paretos,
+        'min': minimums,
+        'max': maximums,
+    }
+
+def author_stats(frontiers: ArchiveFrontiers) -> dict:
+    """Per author arrays, aligned with frontiers.author_names"""
+    n_authors = len(frontiers.author_names)
+    level_author = np.unique(frontiers.level_index() * n_authors + frontiers.authors)
+    return {
+        'solutions': np.bincount(frontiers.authors, minlength=n_authors),
+        'levels': np.bincount(level_author % n_authors, minlength=n_authors),
+    }
+
+def write_reports(frontiers: ArchiveFrontiers, levels: dict, authors: dict, output_dir: Path):
+    output_dir.mkdir(parents=True, exist_ok=True)
+    id2name = get_level_registry().id2name
+
+    level_rows = [{'level_id': level_id,
+                   'level': id2name[level_id],
+                   'solutions': int(levels['solutions'][i]),
+                   'flagged': int(levels['flagged'][i]),
+                   'authors': int(levels['authors'][i]),
+                   'filling_fraction': round(float(levels['filling_fraction'][i]), 4),
+                   **{f'{bound}_{metric}': int(levels[bound][i, j])
+                      for bound in ['min', 'max'] for j, metric in enumerate(['cycles', 'reactors', 'symbols'])}}
+                  for i, level_id in enumerate(frontiers.level_ids)]
+    author_rows = sorted(({'author': name,
+                           'solutions': int(authors['solutions'][i]),
+                           'levels': int(authors['levels'][i])}
+                          for i, name in enumerate(frontiers.author_names)),
+                         key=lambda row: (-row['solutions'], row['author'].lower()))
+
+    for file_name, rows in [('levels.csv', level_rows), ('authors.csv', author_rows)]:
+        with open(output_dir / file_name, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else [])
+            writer.writeheader()
+            writer.writerows(rows)
+
+    with open(output_dir / 'stats.json', 'w') as f:
+        json.dump({'levels': level_rows, 'authors': author_rows}, f, indent=1)
+
+def main():
+    id2name = get_level_registry().id2name
+    frontiers = load_archive(args.archive_dir, args.jobs)
+    levels = level_stats(frontiers)
+
+    if args.output_dir:
+        write_reports(frontiers, levels, author_stats(frontiers), args.output_dir)
+
+    print('level, solutions, filling fraction')
+    for i, db_id in enumerate(frontiers.level_ids):
+        print(f'"{id2name[db_id]}", {levels["solutions"][i]}, {levels["filling_fraction"][i]:.2f}')
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-a", "--archive-dir", type=Path, default=ARCHIVE_DIR)
+    parser.add_argument("-o", "--output-dir", type=Path, help="write levels.csv, authors.csv and stats.json here")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="processes reading the solution files")
+    args = parser.parse_args()
+
     main()
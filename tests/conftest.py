@@ -0,0 +1,13 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(autouse=True)
+def repo_cwd(monkeypatch):
+    # the level registry reads config/ relative to the working directory
+    monkeypatch.chdir(ROOT)
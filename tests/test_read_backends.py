@@ -0,0 +1,72 @@
+from read_backends import ExportReadBackend
+from write_backends import ExportWriteBackend, make_level_dicts
+
+
+def write_layout(write_backend, x):
+    write_backend.write_component({'type': 'custom-reactor', 'x': x, 'y': 4})
+    write_backend.write_members([{'type': 'instr-start', 'arrow_dir': 0, 'choice': 0, 'layer': 64,
+                                  'x': 1, 'y': 2, 'element_type': 0, 'element': 0}])
+    write_backend.write_pipes([(0, 1, 2)])
+    write_backend.write_annotations([])
+
+
+def write_export(folder, id2name, level_id, author, description, sol_id=1):
+    write_backend = ExportWriteBackend(folder, id2name)
+    write_backend.write_solution(level_id, author, 100, 20, 1, description)
+    write_layout(write_backend, 3)
+    write_backend.commit(sol_id, sol_id=sol_id)
+    write_backend.close()
+
+
+def read_layout(read_backend, sol_id):
+    return [(component['type'], component['x'], component['y'], read_backend.read_pipes(component['component_id']))
+            for component in read_backend.read_components(sol_id)]
+
+
+def test_split_fields_leading_apostrophe():
+    split = ExportReadBackend.split_fields
+    assert split("Level,'Tis done,1-2-3") == ['Level', "'Tis done", '1-2-3']
+    assert split("Level,'Tis' done,1-2-3") == ['Level', "'Tis' done", '1-2-3']
+    assert split("'a, b',c,'it''s'") == ['a, b', 'c', "it's"]
+    assert split("'',1,2,''") == ['', '1', '2', '']
+
+
+def test_export_round_trip_apostrophes(tmp_path):
+    id2name, name2id = make_level_dicts()
+    level_id = next(iter(id2name))
+    cases = [("'Tis done", "'Tis done"), ("'x'", "'Tis, done"), ('bob', "it's 'quoted'")]
+    for sol_id, (author, description) in enumerate(cases, 1):
+        folder = tmp_path / str(sol_id)
+        write_export(folder, id2name, level_id, author, description, sol_id)
+
+        read_backend = ExportReadBackend(folder, name2id)
+        [solution] = read_backend.read_solutions(None, pareto_only=False)
+        assert solution == (sol_id, level_id, author, description, 100, 20, 1)
+        assert read_layout(read_backend, sol_id) == [('custom-reactor', 3, 4, [(0, 1, 2)])]
+
+
+def test_export_round_trip_duplicates(tmp_path):
+    """Duplicates are only a header in duplicates.psv, they read back with the layout of their original"""
+    id2name, name2id = make_level_dicts()
+    level_id = next(iter(id2name))
+    write_backend = ExportWriteBackend(tmp_path, id2name)
+    # (sol_id, file, layout or the sol_id it duplicates), the files past the first hold several solutions
+    solutions = [(1, '1', 3), (2, 'grouped', 5), (3, 'grouped', 7), (4, '4', 1), (5, 'grouped', 3)]
+    committed = {}
+    for sol_id, file_name, layout in solutions:
+        write_backend.write_solution(level_id, f'author {sol_id}', 100, 20, 1, f'name {sol_id}')
+        if sol_id in (4, 5):
+            assert write_backend.write_reference(layout, committed[layout])
+        else:
+            write_layout(write_backend, layout)
+        committed[sol_id] = write_backend.commit(file_name, sol_id=sol_id)
+    write_backend.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['1.txt', 'duplicates.psv', 'grouped.txt']
+
+    read_backend = ExportReadBackend(tmp_path, name2id)
+    read = {sol_id: (author, name) for sol_id, _, author, name, *_ in read_backend.read_solutions(None, False)}
+    assert read == {1: ('author 1', 'name 1'), 4: ('author 4', 'name 4'), 'grouped': ('author 2', 'name 2'),
+                    'grouped!1': ('author 3', 'name 3'), 'grouped!2': ('author 5', 'name 5')}
+    assert read_layout(read_backend, 4) == read_layout(read_backend, 1)
+    assert read_layout(read_backend, 'grouped!2') == read_layout(read_backend, 'grouped!1')
+    assert read_layout(read_backend, 'grouped!1') == [('custom-reactor', 7, 4, [(0, 1, 2)])]
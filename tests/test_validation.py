@@ -0,0 +1,50 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from validation import INVALID, OVER_BUDGET, VALID, ValidationScheduler, declared_cost, declared_score
+
+EXPORT = """SOLUTION:Of Pancakes and Spaceships,ann,{cycles}-1-10
+COMPONENT:'custom-research-reactor',2,0,''
+MEMBER:'instr-start',0,0,128,1,1,0,0
+PIPE:0,4,1
+"""
+
+
+def test_declared_score():
+    export = "SOLUTION:'Crossover, again',ann,1991-3-26,'with, comma'\n"
+    assert declared_score(export) == '1991-3-26'
+    assert declared_cost(export) == 1991 * 3
+    assert declared_cost('garbage') == 0
+
+
+def test_scheduler_next_to_thread_pool():
+    """The readers keep a thread pool and db connections open while validating, the workers must not inherit them"""
+    pytest.importorskip('schem')
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def busy():
+        # keeps a lock held most of the time, like a reader thread in the middle of a fetch
+        while not stop.is_set():
+            with lock:
+                sum(range(10_000))
+
+    with ThreadPoolExecutor(4) as pool:
+        for _ in range(4):
+            pool.submit(busy)
+        try:
+            scheduler = ValidationScheduler(jobs=2, time_budget=5, backlog=4)
+            names = [str(i) for i in range(12)]
+            for i, name in enumerate(names):
+                scheduler.submit(name, EXPORT.format(cycles=101 + 10 * i), sol_id=i)
+            scheduler.drain()
+            done = scheduler.finished()
+        finally:
+            stop.set()
+
+    assert scheduler.context.get_start_method() == 'forkserver'
+    assert [job.file_name for job, _ in done] == names
+    assert all(result.outcome in (VALID, INVALID, OVER_BUDGET) for _, result in done)
+    assert not scheduler.pending
@@ -0,0 +1,190 @@
+import csv
+import heapq
+import os
+import resource
+import sys
+import typing
+from time import monotonic
+from typing import Dict, List
+
+VALID, INVALID, OVER_BUDGET = 'valid', 'invalid', 'over budget'
+
+class ValidationResult(typing.NamedTuple):
+    outcome: str    # VALID, INVALID or OVER_BUDGET
+    export: str     # rescored by schem if VALID, else the original one
+    message: str
+
+class ValidationJob(typing.NamedTuple):
+    file_name: str
+    export: str
+    check_precog: bool
+    cost: int
+    sol_id: object = None   # for the journal
+
+def declared_score(export: str) -> str|None:
+    """The `cycles-reactors-symbols` of the SOLUTION line"""
+    header = export.split('\n', 1)[0].removeprefix('SOLUTION:')
+    try:
+        _, _, score, *_ = next(csv.reader([header], quotechar="'"))
+    except (StopIteration, ValueError):
+        return None
+    return score
+
+def declared_cost(export: str) -> int:
+    """Cycles * reactors from the SOLUTION line, schem runs every reactor every cycle"""
+    try:
+        cycles, reactors, _ = map(int, declared_score(export).split('-'))
+    except (AttributeError, ValueError):
+        return 0
+    return cycles * reactors
+
+def validate_export(export: str, check_precog=False) -> ValidationResult:
+    # deferred, so that exporting without validation doesn't need schem
+    import schem
+    from schem.exceptions import ScoreError, SolutionImportError, SolutionRunError
+
+    try:
+        sol = schem.Solution(export)
+        assert sol.expected_score
+        run_up_to = int(sol.expected_score.cycles*1.2)
+        score = sol.run(max_cycles=run_up_to)
+        sol.expected_score = score
+
+        if check_precog:
+            try:
+                is_precog = sol.is_precognitive(just_run_cycle_count=score.cycles)
+            except TimeoutError as e: # mark timeouts as precog to be sure
+                print(f"{type(e).__name__}: {e}")
+                is_precog = True
+            if is_precog:
+                sol.name = ('/P ' + sol.name) if sol.name else '/P'
+
+        return ValidationResult(VALID, sol.export_str(), f'Validated {sol.description}')
+
+    except (AssertionError, # used when solution exceeds the number of allowed reactors
+            NotImplementedError, # defense missions
+            SolutionRunError,
+            ScoreError, # can't happen as we handle the declared score manually
+            SolutionImportError,
+            TimeoutError) as e:
+        return ValidationResult(INVALID, export, f"{type(e).__name__}: {e}")
+
+def _run_job(conn, job: ValidationJob, memory_budget: int|None):
+    if memory_budget:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_budget, memory_budget))
+    try:
+        result = validate_export(job.export, job.check_precog)
+    except MemoryError:
+        result = ValidationResult(OVER_BUDGET, job.export, f'Over budget: more than {memory_budget >> 20} MB')
+    conn.send(result)
+    conn.close()
+
+class ValidationScheduler:
+    """
+    Validates the submitted exports in worker processes, up to `jobs` at a time, the most expensive queued one first.
+    A worker is refilled as soon as it's done, submit() only waits for one once `backlog` jobs are queued or running.
+    Every solution gets at most `time_budget` seconds and `memory_budget` bytes of address space,
+    past that it's killed and reported as OVER_BUDGET instead of holding up the run.
+    """
+
+    def __init__(self, jobs: int|None = None, time_budget: float|None = None,
+                 memory_budget: int|None = None, backlog=256) -> None:
+        self.jobs = jobs or os.cpu_count() or 1
+        self.time_budget = time_budget
+        self.memory_budget = memory_budget
+        self.backlog = backlog
+        self.context = None
+        self.submitted: Dict[int, ValidationJob] = {}   # seq -> job, until its result is handed out
+        self.queue: List[tuple[int, int]] = []          # heap of (-cost, seq)
+        self.running = {}                               # result pipe -> (seq, process, deadline)
+        self.results: Dict[int, ValidationResult] = {}  # seq -> result, until it's handed out
+        self.next_seq = 0
+        self.next_result = 0
+
+    @property
+    def pending(self) -> bool:
+        return bool(self.submitted)
+
+    def submit(self, file_name: str, export: str, check_precog=False, sol_id=None):
+        seq = self.next_seq
+        self.next_seq += 1
+        self.submitted[seq] = ValidationJob(file_name, export, check_precog, declared_cost(export), sol_id)
+        heapq.heappush(self.queue, (-self.submitted[seq].cost, seq))
+        self._pump(block=len(self.queue) + len(self.running) >= self.backlog)
+
+    def finished(self) -> List[tuple[ValidationJob, ValidationResult]]:
+        """The jobs done since the last call, in submission order, a job waits for all the ones submitted before it"""
+        self._pump(block=False)
+        done = []
+        while self.next_result in self.results:
+            done.append((self.submitted.pop(self.next_result), self.results.pop(self.next_result)))
+            self.next_result += 1
+        return done
+
+    def wait(self):
+        """Waits for at least one running job"""
+        self._pump(block=True)
+
+    def drain(self):
+        """Waits for every submitted job"""
+        while self.queue or self.running:
+            self._pump(block=True)
+
+    def _start_workers(self):
+        if self.context is None:
+            from importlib.util import find_spec
+            from multiprocessing import get_context
+
+            if find_spec('schem') is None:
+                raise ModuleNotFoundError("No module named 'schem'", name='schem')
+            # not a plain fork, the caller can have reader threads and db connections live.
+            # The workers fork off a clean server process which loads schem once for all of them.
+            # Every worker still reruns the main script, so the server also loads the modules of ours it imports
+            here = os.path.dirname(os.path.abspath(__file__))
+            ours = sorted(name for name, module in list(sys.modules.items())
+                          if name != '__main__' and os.path.dirname(getattr(module, '__file__', None) or '') == here)
+            self.context = get_context('forkserver')
+            self.context.set_forkserver_preload(['schem', *ours])
+
+        while self.queue and len(self.running) < self.jobs:
+            _, seq = heapq.heappop(self.queue)
+            receiver, sender = self.context.Pipe(duplex=False)
+            process = self.context.Process(target=_run_job, args=(sender, self.submitted[seq], self.memory_budget),
+                                           daemon=True)
+            process.start()
+            sender.close()
+            deadline = monotonic() + self.time_budget if self.time_budget else None
+            self.running[receiver] = (seq, process, deadline)
+
+    def _pump(self, block: bool):
+        """Collects the finished workers and starts new ones, if `block` waits until at least one finishes"""
+        from multiprocessing.connection import wait
+
+        self._start_workers()
+        if not self.running:
+            return
+        deadlines = [deadline for _, _, deadline in self.running.values() if deadline]
+        timeout = max(min(deadlines) - monotonic(), 0) if deadlines else None
+        for receiver in wait(list(self.running), timeout if block else 0):
+            seq, process, _ = self.running.pop(receiver)
+            try:
+                self.results[seq] = receiver.recv()
+            except EOFError: # died without answering, most likely the memory limit hit outside python
+                pass
+            receiver.close()
+            process.join()
+            if seq not in self.results:
+                self.results[seq] = ValidationResult(OVER_BUDGET if self.memory_budget else INVALID,
+                                                     self.submitted[seq].export,
+                                                     f'Worker died with exit code {process.exitcode}')
+
+        now = monotonic()
+        for receiver, (seq, process, deadline) in list(self.running.items()):
+            if deadline and deadline <= now:
+                process.kill()
+                process.join()
+                receiver.close()
+                del self.running[receiver]
+                self.results[seq] = ValidationResult(OVER_BUDGET, self.submitted[seq].export,
+                                                     f'Over budget: more than {self.time_budget}s')
+        self._start_workers()
@@ -1,29 +1,24 @@
-import csv
 import os
 import re
 import shutil
 import sqlite3
 
 from abc import ABC, abstractmethod
+from collections import Counter
 from io import StringIO
 
-import schem
-from schem.exceptions import ScoreError, SolutionImportError, SolutionRunError
+from journal import Journal
+from level_registry import get_level_registry
+from validation import INVALID, OVER_BUDGET, VALID, ValidationScheduler, declared_score, validate_export
 
 def make_level_dicts() -> tuple[dict, dict]:
-    """ Returns id2name, name2id"""
-    id2name = dict()
-    name2id = dict()
-
-    with open('config/levels.csv') as levels_csv:
-        reader = csv.DictReader(levels_csv, skipinitialspace=True)
-        for row in reader:
-            id2name[row['saveId']] = row['name']
-            name2id[row['name']] = row['saveId']
-
-    return id2name, name2id
+    """ Returns copies of id2name, name2id, the registry's own dicts are shared"""
+    registry = get_level_registry()
+    return dict(registry.id2name), dict(registry.name2id)
 
 class AbstractWriteBackend(ABC):
+    # set by the backends running journaled, the solutions it has as done can be skipped
+    journal: Journal|None = None
 
     @abstractmethod
     def write_solution(self, db_level_name, author, c, s, r, description, replace_base):
@@ -46,21 +41,41 @@ class AbstractWriteBackend(ABC):
         pass
 
     @abstractmethod
-    def commit(self, file_name, validate=False, check_precog=False):
+    def write_reference(self, original_sol_id, original) -> bool:
+        """Use the layout of an already committed solution, `original` is what its commit returned.
+        Returns False if the backend can't do it, the layout must then be written in full."""
+        pass
+
+    @abstractmethod
+    def commit(self, file_name, validate=False, check_precog=False, sol_id=None):
+        """`sol_id` is what the journal records the commit under, if there's one"""
         pass
 
+    def resumed_commits(self) -> dict:
+        """str(sol_id) -> what its commit returned, for the solutions of a resumed journal which can still
+        be referenced, in commit order"""
+        return {}
+
     @abstractmethod
     def close(self):
         pass
 
 
 class SaveWriteBackend(AbstractWriteBackend):
-    def __init__(self, savefile) -> None:
+    def __init__(self, savefile, journal=False, resume=False) -> None:
         self.sv_conn = sqlite3.connect(savefile)
         self.sv_cur = self.sv_conn.cursor()
 
         self.db_level_id: str|None
         self.comp_id: int|None
+        # bumped every time a level id is deleted, so we know when a reference points to a replaced solution
+        self.generations: dict[str, int] = {}
+
+        if journal or resume:
+            # the undo token is the level id the interrupted solution went to
+            self.journal = Journal(f'{savefile}.journal', resume)
+            self.journal.recover(self.delete_solution)
+            self.sv_conn.commit()
 
     def write_solution(self, db_level_name, author, c, s, r, description: str, replace_base=True):
 
@@ -84,12 +99,21 @@ class SaveWriteBackend(AbstractWriteBackend):
             db_level_id = db_level_name + '!' + target
             self.sv_cur.execute(r"""INSERT INTO Level
                                     VALUES (?, 0, ?, ?, ?, ?, 0, 0, 0)""",
-                                [db_level_id,
-                                 re.sub(r'\r?\n', ' ', description.strip())
-                                 if description else 'Unnamed Solution',
-                                 c, s, r])
+                                [db_level_id, self.stored_description(description), c, s, r])
         self.db_level_id = db_level_id
 
+    @staticmethod
+    def stored_description(description: str|None) -> str:
+        """What the `mastered` column of a CE solution ends up holding"""
+        return re.sub(r'\r?\n', ' ', description.strip()) if description else 'Unnamed Solution'
+
+    def existing_solutions(self) -> Counter:
+        """(level, cycles, symbols, reactors, description) of the CE solutions in the save, with their multiplicity"""
+        self.sv_cur.execute(r"""SELECT SUBSTR(id, 1, INSTR(id, '!') - 1), cycles, symbols, reactors, mastered
+                                FROM Level
+                                WHERE INSTR(id, '!') AND cycles != 0""")
+        return Counter(self.sv_cur.fetchall())
+
     def delete_solution(self, db_level_id):
         # delete everything (Component, Member, Annotation, Pipe, UndoPtr, Undo) about the old solution
         self.sv_cur.execute(r'SELECT rowid FROM Component WHERE level_id = ?', (db_level_id,))
@@ -103,6 +127,7 @@ class SaveWriteBackend(AbstractWriteBackend):
 
         # delete the solution itself
         self.sv_cur.execute(r'DELETE FROM Level WHERE id = ?', (db_level_id,))
+        self.generations[db_level_id] = self.generations.get(db_level_id, 0) + 1
 
     def delete_all_solutions(self, db_level_name):
         self.sv_cur.execute(r"""SELECT id FROM Level WHERE id like ?""", (db_level_name + '%',))
@@ -131,34 +156,120 @@ class SaveWriteBackend(AbstractWriteBackend):
         self.sv_cur.executemany(r"""INSERT INTO Annotation
                                     VALUES (?, ?, ?, ?, ?, ?)""", db_annotations)
 
-    def commit(self, file_name, validate=False, check_precog=False):
+    def write_reference(self, original_sol_id, original) -> bool:
+        original_level_id, generation = original
+        if self.generations.get(original_level_id, 0) != generation:
+            return False
+
+        self.sv_cur.execute(r'SELECT rowid FROM Component WHERE level_id = ? ORDER BY rowid', (original_level_id,))
+        for (original_comp_id,) in self.sv_cur.fetchall():
+            self.sv_cur.execute(r"""INSERT INTO Component
+                                    SELECT NULL, ?, type, x, y, NULL, 200, 255, 0
+                                    FROM Component WHERE rowid = ?""",
+                                (self.db_level_id, original_comp_id))
+            self.comp_id = self.sv_cur.lastrowid
+            self.sv_cur.execute(r"""INSERT INTO Member
+                                    SELECT NULL, ?, type, arrow_dir, choice, layer, x, y, element_type, element
+                                    FROM Member WHERE component_id = ? ORDER BY rowid""",
+                                (self.comp_id, original_comp_id))
+            self.sv_cur.execute(r"""INSERT INTO Pipe
+                                    SELECT ?, output_id, x, y
+                                    FROM Pipe WHERE component_id = ? ORDER BY rowid""",
+                                (self.comp_id, original_comp_id))
+            self.sv_cur.execute(r"""INSERT INTO Annotation
+                                    SELECT ?, output_id, expanded, x, y, annotation
+                                    FROM Annotation WHERE component_id = ? ORDER BY rowid""",
+                                (self.comp_id, original_comp_id))
+        return True
+
+    def commit(self, file_name, validate=False, check_precog=False, sol_id=None):
+        committed = (self.db_level_id, self.generations.get(self.db_level_id, 0))
+        if self.journal and sol_id is not None:
+            self.journal.begin(sol_id, self.db_level_id)
+            self.sv_conn.commit()
+            self.journal.commit(sol_id, 'written')
         self.db_level_id = None
         self.comp_id = None
+        return committed
+
+    def resumed_commits(self) -> dict:
+        # only the last solution written to a level id is still there, at the generation the run started from,
+        # recover() bumped the ones it rolled back
+        if not self.journal:
+            return {}
+        last_writes = {level_id: sol_id for sol_id, level_id in self.journal.tokens.items()}
+        return {sol_id: (self.journal.tokens[sol_id], 0) for sol_id in self.journal.done
+                if last_writes.get(self.journal.tokens.get(sol_id)) == sol_id}
 
     def close(self):
         self.sv_conn.commit()
         self.sv_conn.close()
+        if self.journal:
+            self.journal.close()
 
 
 class ExportWriteBackend(AbstractWriteBackend):
 
     @staticmethod
     def encode(s: str) -> str:
-        return "'" + s.replace("'", "''") + "'" if ',' in s else s
+        return "'" + s.replace("'", "''") + "'" if ',' in s or s.startswith("'") else s
 
-    def __init__(self, folder, id2name) -> None:
+    def __init__(self, folder, id2name, scheduler: ValidationScheduler|None = None,
+                 journal=False, resume=False) -> None:
         self.f = StringIO()
         self.folder = folder
         self.id2name = id2name
+        self.reference = None
+        # str(sol_id) -> score of the solutions written out in full, validated when validating
+        self.scores: dict = {}
+        # str(sol_id) -> `<file>.txt:<offset of its SOLUTION line>` of the same solutions, what duplicates refer to
+        self.locations: dict = {}
+        # str(sol_id) of the solutions submitted to the scheduler and not written yet
+        self.validating: set = set()
+        # if given, validations are queued and their exports written a batch at a time
+        self.scheduler = scheduler
+
+        # without a journal there's no telling what's in the folder, so resuming starts from scratch
+        journal_file = f'{folder}/journal.psv'
+        if not (resume and os.path.exists(journal_file)):
+            shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder, exist_ok=True)
+
+        if journal or resume:
+            # the undo token is `<file>:<size before the append>`
+            self.journal = Journal(journal_file, resume)
+            self.journal.recover(self.truncate)
 
-        shutil.rmtree(folder, ignore_errors=True)
-        os.mkdir(folder)
+    @staticmethod
+    def truncate(token: str):
+        path, size = token.rsplit(':', 1)
+        if int(size):
+            os.truncate(path, int(size))
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def append(self, path: str, text: str, sol_id=None, outcome=VALID) -> int:
+        """Returns the offset `text` was written at"""
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        journaled = self.journal and sol_id is not None
+        if journaled:
+            self.journal.begin(sol_id, f'{path}:{offset}')
+        with open(path, "a") as f:
+            print(text, file=f)
+        if journaled:
+            self.journal.commit(sol_id, outcome)
+        return offset
+
+    def write_export(self, file_name, export: str, sol_id, outcome):
+        offset = self.append(f"{self.folder}/{file_name}.txt", export, sol_id, outcome)
+        self.scores[str(sol_id)] = declared_score(export)
+        self.locations[str(sol_id)] = f'{file_name}.txt:{offset}'
 
     def write_solution(self, db_level_name, author, c, s, r, description: str, replace_base=None):
         level_name = self.encode(self.id2name[db_level_name])
         comma_name = ',' + self.encode(re.sub(r'\r?\n', ' ', description.strip())) \
                      if (description and isinstance(description, str)) else ''
-        print(f"SOLUTION:{level_name},{author},{c}-{r}-{s}{comma_name}",
+        print(f"SOLUTION:{level_name},{self.encode(author)},{c}-{r}-{s}{comma_name}",
               file=self.f)
 
     def write_component(self, component):
@@ -184,46 +295,77 @@ class ExportWriteBackend(AbstractWriteBackend):
                                                        annotation["x"], annotation["y"], annotation_str),
                   file=self.f)
 
-    def commit(self, file_name, validate=False, check_precog=False) -> str:
+    def write_reference(self, original_sol_id, original) -> bool:
+        # only once the original made it to its .txt, with the score this one declares
+        original_sol_id = str(original_sol_id)
+        while original_sol_id in self.validating:
+            self.scheduler.wait()
+            self.write_validated()
+        if original_sol_id not in self.scores or self.scores[original_sol_id] != declared_score(self.f.getvalue()):
+            return False
+        self.reference = self.locations[original_sol_id]
+        return True
+
+    def commit(self, file_name, validate=False, check_precog=False, sol_id=None) -> str:
         export = self.f.getvalue()
-        if validate:
-            try:
-                sol = schem.Solution(export)
-                assert sol.expected_score
-                run_up_to = int(sol.expected_score.cycles*1.2)
-                score = sol.run(max_cycles=run_up_to)
-                sol.expected_score = score
-
-                if check_precog:
-                    try:
-                        is_precog = sol.is_precognitive(just_run_cycle_count=score.cycles)
-                    except TimeoutError as e: # mark timeouts as precog to be sure
-                        print(f"{type(e).__name__}: {e}")
-                        is_precog = True
-                    if is_precog:
-                        sol.name = ('/P ' + sol.name) if sol.name else '/P'
-
-                export = sol.export_str()
-                print(f'Validated {sol.description}')
-
-            except (AssertionError, # used when solution exceeds the number of allowed reactors
-                    NotImplementedError, # defense missions
-                    SolutionRunError,
-                    ScoreError, # can't happen as we handle the declared score manually
-                    SolutionImportError,
-                    TimeoutError) as e:
-                print(f"{type(e).__name__}: {e}")
-                self.f = StringIO()
-                return export
-
-        with open(f"{self.folder}/{file_name}.txt", "a") as f:
-            print(export, file=f)
+        if self.reference is not None:
+            # duplicates only get their header recorded, next to where the solution with the same layout starts
+            header = export.split('\n', 1)[0]
+            self.append(f"{self.folder}/duplicates.psv", f"{file_name}|{self.reference}|{header}",
+                        sol_id, 'duplicate')
+            self.reference = None
+            self.f = StringIO()
+            return export
 
         self.f = StringIO()
+        if validate and self.scheduler:
+            self.scheduler.submit(file_name, export, check_precog, sol_id)
+            self.validating.add(str(sol_id))
+            self.write_validated()
+            return export
+
+        if validate:
+            return self.write_result(file_name, validate_export(export, check_precog), sol_id)
+
+        self.write_export(file_name, export, sol_id, 'written')
         return export
 
+    def write_result(self, file_name, result, sol_id=None) -> str:
+        print(result.message)
+        if result.outcome == VALID:
+            self.write_export(file_name, result.export, sol_id, VALID)
+        elif result.outcome == OVER_BUDGET:
+            header = result.export.split('\n', 1)[0]
+            self.append(f"{self.folder}/over_budget.psv", f"{file_name}|{result.message}|{header}",
+                        sol_id, OVER_BUDGET)
+        elif self.journal and sol_id is not None:
+            self.journal.commit(sol_id, INVALID)
+        return result.export
+
+    def resumed_commits(self) -> dict:
+        # the SOLUTION line at the start of each append says what score the export was written with
+        if not self.journal:
+            return {}
+        for sol_id, outcome in self.journal.done.items():
+            if outcome in (VALID, 'written'):
+                path, offset = self.journal.tokens[sol_id].rsplit(':', 1)
+                with open(path, 'rb') as f:
+                    f.seek(int(offset))
+                    self.scores[sol_id] = declared_score(f.readline().decode())
+                self.locations[sol_id] = f'{os.path.basename(path)}:{offset}'
+        return {sol_id: None for sol_id in self.scores}
+
+    def write_validated(self):
+        for job, result in self.scheduler.finished():
+            self.write_result(job.file_name, result, job.sol_id)
+            self.validating.discard(str(job.sol_id))
+
     def close(self):
-        pass
+        if self.scheduler and self.scheduler.pending:
+            self.scheduler.drain()
+            self.write_validated()
+        if self.journal:
+            self.journal.close()
 
 
 class NoopWriteBackend(AbstractWriteBackend):
@@ -245,7 +387,11 @@ class NoopWriteBackend(AbstractWriteBackend):
     def write_annotations(self, annotations):
         pass
 
-    def commit(self, file_name, validate=False, check_precog=False):
+    def write_reference(self, original_sol_id, original) -> bool:
+        print(f'Same layout as {original_sol_id}')
+        return True
+
+    def commit(self, file_name, validate=False, check_precog=False, sol_id=None):
         pass
 
     def close(self):